@@ -1,3 +1,9 @@
-from .celery import app as celery_app
-
 __all__ = ('celery_app',)
+
+
+def __getattr__(name):
+    # celery app is created on first use, so web processes that do not send tasks never import celery
+    if name == 'celery_app':
+        from .celery import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
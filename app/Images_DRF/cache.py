@@ -0,0 +1,125 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+class LocalCache:
+    """
+    Small in-process LRU cache with per-entry timeout, put in front of django cache for the hottest keys.
+    Entries are not shared between processes, so timeouts should be short.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + timeout)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class RedisCache(BaseCache):
+    """
+    Django cache backend on redis, shared by all web and celery processes (django 3.2 has none).
+    Values are pickled, LOCATION is redis URL of a database used only by this cache.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server
+
+    @property
+    def client(self):
+        # one connection pool per process, cache backends are created per thread
+        client = _clients.get(self._server)
+        if client is None:
+            with _clients_lock:
+                client = _clients.get(self._server)
+                if client is None:
+                    import redis
+                    client = _clients[self._server] = redis.Redis.from_url(self._server)
+        return client
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else int(timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return False
+        return bool(self.client.set(self._key(key, version), pickle.dumps(value), ex=timeout, nx=True))
+
+    def get(self, key, default=None, version=None):
+        value = self.client.get(self._key(key, version))
+        return default if value is None else pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        values = self.client.mget(list(keys)) if keys else []
+        return {keys[key]: pickle.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            self.delete(key, version)
+        else:
+            self.client.set(self._key(key, version), pickle.dumps(value), ex=timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        timeout = self._timeout(timeout)
+        if timeout is None:
+            return bool(self.client.persist(key))
+        return bool(self.client.expire(key, timeout))
+
+    def delete(self, key, version=None):
+        return bool(self.client.delete(self._key(key, version)))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self._key(key, version)))
+
+    def clear(self):
+        self.client.flushdb()
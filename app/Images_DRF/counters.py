@@ -0,0 +1,20 @@
+import threading
+
+from django.conf import settings
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Returns redis client shared by fast counters (throttling, link hits) or None if COUNTERS_REDIS_URL is not set,
+    counters are then kept in process memory.
+    """
+    global _client
+    if _client is None and settings.COUNTERS_REDIS_URL:
+        with _client_lock:
+            if _client is None:
+                import redis
+                _client = redis.Redis.from_url(settings.COUNTERS_REDIS_URL)
+    return _client
@@ -12,8 +12,6 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 from pathlib import Path
 
-import Images_DRF.tasks
-from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 
@@ -47,6 +45,8 @@ INSTALLED_APPS = [
     # my apps
     'accounts',
     'images',
+    # after my apps, so content types keep ids from fixtures
+    'rest_framework.authtoken',
 ]
 
 MIDDLEWARE = [
@@ -91,6 +91,8 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # reuse connections between requests instead of connecting on every request
+        "CONN_MAX_AGE": int(os.environ.get("SQL_CONN_MAX_AGE", 60)),
     }
 }
 
@@ -115,12 +117,15 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.BasicAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'accounts.throttling.TierRequestRateThrottle',
+    ),
 }
 
 
@@ -156,14 +161,47 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CELERY_BROKER_URL = "redis://redis:6379"
 CELERY_RESULT_BACKEND = "redis://redis:6379"
+# registered by worker and beat on start, web processes import tasks only when sending them
+CELERY_IMPORTS = ("Images_DRF.tasks",)
+
+# Fast counters (throttling, link hits), kept in process memory if not set. In-process counters are only fit
+# for development and tests, link hits counted by web processes are never flushed by celery then.
+
+COUNTERS_REDIS_URL = os.environ.get("COUNTERS_REDIS_URL")
+
+# Cache of perks, tokens and tier limits, invalidated by signals, must be shared by all web and celery processes.
+# Without CACHE_REDIS_URL every process has its own cache, which is only fit for development and tests.
+
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "Images_DRF.cache.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
 
 CELERY_BEAT_SCHEDULE = {
     "delete_expired": {
         "task": "Images_DRF.tasks.delete_expired",
-        "schedule": crontab(minute="*/1"),
+        "schedule": 60.0,
+    },
+    "flush_link_hits": {
+        "task": "Images_DRF.tasks.flush_link_hits",
+        "schedule": 60.0,
     },
 }
 
+ACCOUNTS = {
+    # shared by all processes through django cache, invalidated when token or user changes
+    'token_cache_seconds': 300,
+    # per process, other processes see deleted tokens and deactivated users after this time
+    'token_local_cache_seconds': 30,
+    # per process, other processes see changed tiers, tier limits and perks after this time
+    'tier_local_cache_seconds': 5,
+}
+
 IMAGES = {
     'max_seconds': 10000,
     'min_seconds': 100,
@@ -171,5 +209,16 @@ IMAGES = {
         200: '200px thumbnail',
         400: '400px thumbnail'
     },
-    'original_image_perk': 'original_image'
+    'original_image_perk': 'original_image',
+    # uploads are checked against these from the image header, before any decoding
+    'max_pixels': 50_000_000,
+    # memory of decoded pixel data, also checked before renditions are made
+    'max_decoded_bytes': 200_000_000,
+    'auto_orient': True,
+    'strip_exif': False,
+    'jpeg_quality': 90,
+    # per process, other processes see deleted links after this time
+    'link_local_cache_seconds': 5,
+    # expire links by hourly partitions, run partition_expiring_links once on PostgreSQL
+    'link_partitions': False,
 }
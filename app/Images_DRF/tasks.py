@@ -1,7 +1,28 @@
-from celery import shared_task
 from django.core.management import call_command
 
+from .celery import app
 
-@shared_task
+
+@app.task
 def delete_expired():
     call_command('delete_expired', )
+
+
+@app.task
+def flush_link_hits():
+    call_command('flush_link_hits', )
+
+
+@app.task
+def delete_files(names):
+    from images.files import delete_image_files
+    delete_image_files(names)
+
+
+@app.task
+def build_export(export_id):
+    from images.export import build_archive
+    from images.models import Export
+    export = Export.objects.filter(pk=export_id).first()
+    if export is not None:
+        build_archive(export)
@@ -15,8 +15,14 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from rest_framework.authtoken.views import obtain_auth_token
+
+from .views import health, ready
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('token/', obtain_auth_token, name='token'),
+    path('health/', health, name='health'),
+    path('ready/', ready, name='ready'),
     path('', include('images.urls')),
 ]
@@ -0,0 +1,33 @@
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+
+# set once all migrations are applied, database is then the only thing checked
+_migrated = False
+
+
+def health(request):
+    """
+    Liveness probe, process is able to serve requests
+    """
+    return JsonResponse({'status': 'ok'})
+
+
+def ready(request):
+    """
+    Readiness probe, database is reachable and all migrations are applied
+    """
+    global _migrated
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        # persistent connection may have been closed by the server since last request
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not _migrated:
+            executor = MigrationExecutor(connection)
+            if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+                return JsonResponse({'status': 'migrations pending'}, status=503)
+            _migrated = True
+    except DatabaseError:
+        return JsonResponse({'status': 'database unavailable'}, status=503)
+    return JsonResponse({'status': 'ok'})
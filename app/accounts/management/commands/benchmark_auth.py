@@ -0,0 +1,50 @@
+import base64
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from accounts.authentication import CachedTokenAuthentication, invalidate_tokens
+
+
+class Command(BaseCommand):
+    help = "Compare CPU time of basic and cached token authentication per media request"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20)
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        factory = APIRequestFactory()
+        key = Token.generate_key()
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user('benchmark_auth', password='benchmark_auth')
+                Token.objects.create(user=user, key=key)
+                credentials = base64.b64encode(b'benchmark_auth:benchmark_auth').decode()
+                basic_request = factory.get('/media/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+                token_request = factory.get('/media/', HTTP_AUTHORIZATION=f'Token {key}')
+
+                basic = self.measure(BasicAuthentication(), basic_request, requests)
+                # first request fills the cache
+                CachedTokenAuthentication().authenticate(token_request)
+                cached = self.measure(CachedTokenAuthentication(), token_request, requests)
+                transaction.set_rollback(True)
+        finally:
+            # rolled back token sends no signals, its cache entries are removed once the transaction is over
+            invalidate_tokens([key])
+
+        self.stdout.write(f"basic auth:        {basic * 1e6:10.1f} us CPU per request")
+        self.stdout.write(f"cached token auth: {cached * 1e6:10.1f} us CPU per request")
+        self.stdout.write(f"saved:             {(basic - cached) * 1e6:10.1f} us CPU per request")
+
+    @staticmethod
+    def measure(authentication, request, requests):
+        start = time.process_time()
+        for _ in range(requests):
+            authentication.authenticate(request)
+        return (time.process_time() - start) / requests
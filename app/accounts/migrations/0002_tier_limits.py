@@ -0,0 +1,28 @@
+# Generated by Django 3.2.9 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tier',
+            name='download_bytes_per_day',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tier',
+            name='requests_per_second',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tier',
+            name='upload_bytes_per_day',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
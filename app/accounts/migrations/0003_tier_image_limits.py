@@ -0,0 +1,23 @@
+# Generated by Django 3.2.9 on 2026-10-19 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_tier_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tier',
+            name='max_decoded_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tier',
+            name='max_megapixels',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
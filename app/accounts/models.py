@@ -13,6 +13,13 @@ class Perk(models.Model):
 class Tier(models.Model):
     name = models.CharField(max_length=100)
     perks = models.ManyToManyField(Perk)
+    # limits, empty means unlimited
+    requests_per_second = models.PositiveIntegerField(blank=True, null=True)
+    download_bytes_per_day = models.PositiveBigIntegerField(blank=True, null=True)
+    upload_bytes_per_day = models.PositiveBigIntegerField(blank=True, null=True)
+    # uploaded images, checked from the header before decoding
+    max_megapixels = models.PositiveIntegerField(blank=True, null=True)
+    max_decoded_bytes = models.PositiveBigIntegerField(blank=True, null=True)
 
     def __str__(self):
         return f'{self.name}'
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .models import Account, Perk, Tier
+from .tiers import invalidate_tier_accounts, invalidate_tiers
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, using, **kwargs):
+    """
+    Invalidates cached token on delete.
+    """
+    invalidate_tokens([instance.key], using)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, using, **kwargs):
+    """
+    Invalidates cached tokens holding user when it is deactivated or its permissions change.
+    """
+    invalidate_tokens(Token.objects.using(using).filter(user=instance).values_list('key', flat=True), using)
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_account_tier(sender, instance, using, **kwargs):
+    """
+    Invalidates cached tier when account tier changes.
+    """
+    invalidate_tiers([instance.user_id], using)
+
+
+@receiver(post_save, sender=Tier)
+@receiver(pre_delete, sender=Tier)
+def invalidate_changed_tier(sender, instance, using, **kwargs):
+    """
+    Invalidates cached tier of tier accounts when tier limits change or tier is deleted.
+    Accounts are set to NULL tier without signals.
+    """
+    invalidate_tier_accounts([instance.pk], using)
+
+
+@receiver(post_save, sender=Perk)
+@receiver(pre_delete, sender=Perk)
+def invalidate_perk_tiers(sender, instance, using, **kwargs):
+    """
+    Invalidates cached tiers of accounts with tiers having renamed or deleted perk.
+    """
+    invalidate_tier_accounts(instance.tier_set.values_list('pk', flat=True), using)
+
+
+@receiver(m2m_changed, sender=Tier.perks.through)
+def invalidate_changed_tier_perks(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """
+    Invalidates cached tiers when perks are added to or removed from tier.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_tier_accounts([instance.pk], using)
+    elif action == 'pre_clear':
+        invalidate_tier_accounts(instance.tier_set.values_list('pk', flat=True), using)
+    else:
+        invalidate_tier_accounts(pk_set, using)
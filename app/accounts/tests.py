@@ -1,3 +1,118 @@
-from django.test import TestCase
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from Images_DRF.cache import LocalCache
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from .authentication import CachedToken, CachedTokenAuthentication, local_tokens
+
+
+class TokenAuthenticationTest(APITestCase):
+    """
+    Test authentication with cached tokens
+    """
+    fixtures = ['accounts.json']
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.user = User.objects.get(username='seamel')
+        self.token = Token.objects.create(user=self.user)
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_obtain_token(self):
+        """
+        Get token with username and password
+        """
+        response = APIClient().post(reverse('token'), {'username': 'seamel', 'password': 'ZwpDu9BGHRTTqKX'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['token'], self.token.key)
+
+    def test_token_request(self):
+        """
+        Get images list authenticated with token
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.get(reverse('images-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_token(self):
+        """
+        Try to get images list with invalid token
+        """
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        response = client.get(reverse('images-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_token_queries(self):
+        """
+        Test that verified token is authenticated without database queries
+        """
+        CachedTokenAuthentication().authenticate(self.request)
+        with self.assertNumQueries(0):
+            user, token = CachedTokenAuthentication().authenticate(self.request)
+        self.assertEqual(user, self.user)
+
+    def test_cached_token_fields(self):
+        """
+        Only fields needed by authentication are cached, never the password hash
+        """
+        CachedTokenAuthentication().authenticate(self.request)
+        self.assertEqual(cache.get(f'accounts:token:{self.token.key}'), CachedToken(self.user.id, True, False))
+        local_tokens.clear()
+        user, token = CachedTokenAuthentication().authenticate(self.request)
+        self.assertEqual((user.id, user.is_active, user.is_staff, user.password), (self.user.id, True, False, ''))
+        self.assertEqual(token.key, self.token.key)
+
+    def test_deleted_token(self):
+        """
+        Try to authenticate with cached token after it was deleted
+        """
+        CachedTokenAuthentication().authenticate(self.request)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate(self.request)
+
+    def test_deactivated_user(self):
+        """
+        Try to authenticate with cached token after user was deactivated
+        """
+        CachedTokenAuthentication().authenticate(self.request)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate(self.request)
+
+    def test_deactivated_user_other_process(self):
+        """
+        Another process with its own memory stops authenticating deactivated user once its local copy expires
+        """
+        with tempfile.TemporaryDirectory() as location, self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            other_tokens = LocalCache()
+            with mock.patch('accounts.authentication.local_tokens', other_tokens):
+                CachedTokenAuthentication().authenticate(self.request)
+            CachedTokenAuthentication().authenticate(self.request)
+
+            self.user.is_active = False
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+            self.assertIsNone(FileBasedCache(location, {}).get(f'accounts:token:{self.token.key}'))
+            expired = time.monotonic() + settings.ACCOUNTS['token_local_cache_seconds']
+            with mock.patch('accounts.authentication.local_tokens', other_tokens), \
+                    mock.patch('Images_DRF.cache.time.monotonic', return_value=expired), \
+                    self.assertRaises(AuthenticationFailed):
+                CachedTokenAuthentication().authenticate(self.request)
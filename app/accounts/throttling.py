@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+
+from Images_DRF.counters import get_redis_client
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from .tiers import UNLIMITED, get_request_tier
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class RedisCounters:
+    """
+    Counters shared by all processes. Every operation is a single atomic round trip.
+    """
+    # refills bucket for time elapsed since last request and takes one token if available
+    TOKEN_BUCKET = """
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local ts = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return allowed
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.token_bucket = self.client.register_script(self.TOKEN_BUCKET)
+
+    def take_token(self, key, rate, capacity):
+        return bool(self.token_bucket(keys=[key], args=[rate, capacity, time.time()]))
+
+    def get(self, key):
+        return int(self.client.get(key) or 0)
+
+    def add(self, key, amount, timeout):
+        with self.client.pipeline() as pipe:
+            pipe.incrby(key, amount)
+            pipe.expire(key, timeout)
+            return pipe.execute()[0]
+
+
+class LocalCounters:
+    """
+    In-process counters with the same semantics as RedisCounters, used when COUNTERS_REDIS_URL is not set
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._totals = {}
+
+    def take_token(self, key, rate, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            return allowed
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._totals.get(key, (0, None))
+            return value if expires is not None and expires > time.monotonic() else 0
+
+    def add(self, key, amount, timeout):
+        with self._lock:
+            value, expires = self._totals.get(key, (0, None))
+            if expires is None or expires <= time.monotonic():
+                value = 0
+            value += amount
+            self._totals[key] = (value, time.monotonic() + timeout)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._totals.clear()
+
+
+_counters = None
+_counters_lock = threading.Lock()
+
+
+def get_counters():
+    global _counters
+    if _counters is None:
+        with _counters_lock:
+            if _counters is None:
+                client = get_redis_client()
+                _counters = RedisCounters(client) if client else LocalCounters()
+    return _counters
+
+
+def _transfer_key(direction, user_id):
+    return f'throttle:{direction}:{user_id}:{timezone.localdate():%Y%m%d}'
+
+
+def record_transfer(user, direction, size):
+    """
+    Adds transferred bytes to user's daily usage
+    :param user: requesting user
+    :param direction: 'download' or 'upload'
+    :param size: number of bytes
+    """
+    if user.is_authenticated and not user.is_staff and size:
+        get_counters().add(_transfer_key(direction, user.id), size, DAY_SECONDS)
+
+
+class TierRequestRateThrottle(BaseThrottle):
+    """
+    Limits requests per second of authenticated users to their tier 'requests_per_second'.
+    Bursts up to one second worth of requests are allowed.
+    """
+
+    def allow_request(self, request, view):
+        self.rate = None
+        user = request.user
+        if not user.is_authenticated or user.is_staff:
+            return True
+        self.rate = get_request_tier(request).limits.requests_per_second
+        if self.rate is UNLIMITED:
+            return True
+        if not self.rate:
+            return False
+        return get_counters().take_token(f'throttle:rate:{user.id}', self.rate, self.rate)
+
+    def wait(self):
+        return 1 / self.rate if self.rate else None
+
+
+class TierBandwidthThrottle(BaseThrottle):
+    """
+    Rejects requests of users who used their tier daily quota of transferred bytes.
+    Subclasses set `direction`, bytes are counted with record_transfer.
+    """
+    direction = None
+    methods = ()
+
+    def get_request_size(self, request):
+        return 0
+
+    def allow_request(self, request, view):
+        user = request.user
+        if request.method not in self.methods or not user.is_authenticated or user.is_staff:
+            return True
+        quota = getattr(get_request_tier(request).limits, f'{self.direction}_bytes_per_day')
+        if quota is UNLIMITED:
+            return True
+        used = get_counters().get(_transfer_key(self.direction, user.id))
+        return used + self.get_request_size(request) <= quota and used < quota
+
+    def wait(self):
+        now = timezone.localtime()
+        tomorrow = (now + timezone.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return math.ceil((tomorrow - now).total_seconds())
+
+
+class DownloadThrottle(TierBandwidthThrottle):
+    direction = 'download'
+    methods = ('GET',)
+
+
+class UploadThrottle(TierBandwidthThrottle):
+    direction = 'upload'
+    methods = ('POST',)
+
+    def get_request_size(self, request):
+        return int(request.META.get('CONTENT_LENGTH') or 0)
@@ -0,0 +1,84 @@
+from collections import namedtuple
+
+from Images_DRF.cache import LocalCache
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Account, Perk, Tier
+
+TIER_CACHE_TIMEOUT = 60 * 60
+
+# value of a tier limit that restricts nothing, stored as empty field of the tier
+UNLIMITED = None
+
+TierLimits = namedtuple('TierLimits', ('requests_per_second', 'download_bytes_per_day', 'upload_bytes_per_day',
+                                       'max_megapixels', 'max_decoded_bytes'))
+
+# limits of users without account tier
+NO_LIMITS = TierLimits(*(UNLIMITED for _ in TierLimits._fields))
+
+AccountTier = namedtuple('AccountTier', ('perks', 'limits'))
+
+NO_TIER = AccountTier(frozenset(), NO_LIMITS)
+
+local_tiers = LocalCache()
+
+
+def _tier_cache_key(user_id):
+    return f'accounts:tier:{user_id}'
+
+
+def get_tier(user_id):
+    """
+    Returns perks and limits of user's account tier. Cached in process memory for tier_local_cache_seconds
+    and in django cache shared by all processes until account tier, tier limits or tier perks change.
+    :param user_id: id of the user
+    :return: AccountTier with frozenset of perk names and TierLimits
+    """
+    tier = local_tiers.get(user_id)
+    if tier is not None:
+        return tier
+
+    key = _tier_cache_key(user_id)
+    tier = cache.get(key)
+    if tier is None:
+        row = Tier.objects.filter(account__user_id=user_id).values_list('pk', *TierLimits._fields).first()
+        if row is None:
+            tier = NO_TIER
+        else:
+            perks = frozenset(Perk.objects.filter(tier=row[0]).values_list('name', flat=True))
+            tier = AccountTier(perks, TierLimits(*row[1:]))
+        cache.set(key, tier, TIER_CACHE_TIMEOUT)
+    local_tiers.set(user_id, tier, settings.ACCOUNTS.get('tier_local_cache_seconds'))
+    return tier
+
+
+def get_request_tier(request):
+    """
+    Returns tier of the requesting user, looked up once per request by throttles, views and serializers
+    """
+    tier = getattr(request, '_account_tier', None)
+    if tier is None:
+        tier = get_tier(request.user.id)
+        request._account_tier = tier
+    return tier
+
+
+def invalidate_tiers(user_ids, using=None):
+    """
+    Removes cached tiers from django cache and from memory of this process once the transaction commits,
+    so no request caches them again from the old rows. Other processes keep them for at most tier_local_cache_seconds.
+    """
+    user_ids = list(user_ids)
+
+    def invalidate():
+        for user_id in user_ids:
+            local_tiers.delete(user_id)
+        cache.delete_many([_tier_cache_key(user_id) for user_id in user_ids])
+
+    transaction.on_commit(invalidate, using=using)
+
+
+def invalidate_tier_accounts(tier_ids, using=None):
+    invalidate_tiers(Account.objects.using(using).filter(tier__in=tier_ids).values_list('user_id', flat=True), using)
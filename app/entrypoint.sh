@@ -12,8 +12,11 @@ then
 fi
 
 #python manage.py flush --no-input
-python manage.py makemigrations
-python manage.py migrate
+# migrations are committed, only the web service applies them
+if [ "$DJANGO_MIGRATE" = "1" ]
+then
+    python manage.py migrate --no-input
+fi
 #python manage.py collectstatic
 
 exec "$@"
@@ -0,0 +1,32 @@
+"""
+Gunicorn settings of production serving mode, loaded automatically from the working directory:
+gunicorn Images_DRF.wsgi
+
+Every value can be overridden with GUNICORN_* environment variables.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+# one process per core plus one, requests mostly wait for database and storage,
+# threads keep cores busy without more processes.
+# Every thread keeps its own database connection open for SQL_CONN_MAX_AGE seconds (CONN_MAX_AGE),
+# so one container holds up to workers * threads connections, e.g. (4 + 1) * 4 = 20 with 4 cores.
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+# django and app modules are imported once and shared by forked workers
+preload_app = True
+
+# Pillow buffers of thumbnails and uploads fragment worker memory, recycled workers return it to the system
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# empty value disables access log
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
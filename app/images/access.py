@@ -0,0 +1,25 @@
+from accounts.tiers import get_request_tier, get_tier
+from django.conf import settings
+
+
+def can_access(user, owner_id, height=None, request=None):
+    """
+    Checks if user can access image owned by owner_id without touching owner, account or tier rows.
+    :param user: requesting user
+    :param owner_id: Image.owner_id
+    :param height: thumbnail height, None for original image
+    :param request: request of the user, its tier is reused by throttles of the same request
+    :return: bool
+    """
+    if user.is_staff:
+        return True
+    if owner_id != user.id:
+        return False
+    if height is None:
+        perk_name = settings.IMAGES.get('original_image_perk', '')
+    else:
+        perk_name = settings.IMAGES.get('height_perk_name').get(height, None)
+    if perk_name is None:
+        return False
+    tier = get_tier(user.id) if request is None else get_request_tier(request)
+    return perk_name in tier.perks
@@ -1,11 +1,12 @@
 from django.contrib import admin
 
-from .models import Image, ExpiringLink
+from .models import Image, ExpiringLink, Export
 
 
 @admin.register(Image)
 class ImageAdmin(admin.ModelAdmin):
-    exclude = ('width', 'height')
+    exclude = ('width', 'height', 'format', 'mode', 'orientation')
 
 
 admin.site.register(ExpiringLink)
+admin.site.register(Export)
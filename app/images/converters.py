@@ -0,0 +1,37 @@
+import os
+import re
+from uuid import UUID
+
+KEY_REGEX = re.compile(r'[0-9a-f]{32}')
+
+
+def key_from_name(name, suffix_regex=None):
+    """
+    Returns Image.key of file stored as '<key hex>.<extension>', None if the name is anything else,
+    e.g. with suffix added by the storage to avoid overwriting a file
+    :param name: storage name of the file
+    :param suffix_regex: matches rest of the file name after the key, for renditions
+    :return: UUID or None
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    key, suffix = stem[:32], stem[32:]
+    if not KEY_REGEX.fullmatch(key):
+        return None
+    if suffix and (suffix_regex is None or not suffix_regex.fullmatch(suffix)):
+        return None
+    return UUID(key)
+
+
+class ImageKeyConverter:
+    """
+    Matches image file name '<key hex>.<extension>' and converts it to Image.key
+    """
+    regex = r'[0-9a-f]{32}(?:\.\w+)?'
+
+    def to_python(self, value):
+        return UUID(value.split('.')[0])
+
+    def to_url(self, value):
+        if isinstance(value, UUID):
+            return value.hex
+        return value
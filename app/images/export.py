@@ -0,0 +1,95 @@
+import io
+import os
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+
+from .access import can_access
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream(io.RawIOBase):
+    """
+    Unseekable sink for ZipFile, bytes written are collected until the generator yields them
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """
+    Generates stored (not compressed) ZIP archive chunk by chunk, only one chunk of one file is kept in memory.
+    :param entries: iterable of (archive name, callable opening the file) tuples
+    :return: generator of bytes
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for arcname, open_file in entries:
+            with open_file() as source, archive.open(arcname, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    yield stream.pop()
+            yield stream.pop()
+    yield stream.pop()
+
+
+def get_export_name(user, image):
+    """
+    Returns storage name of the original image or of the largest thumbnail user is allowed to access,
+    None if user cannot access any
+    """
+    if can_access(user, image.owner_id):
+        return image.image.name
+    heights = [height for height in settings.IMAGES.get('height_perk_name') if can_access(user, image.owner_id, height)]
+    if not heights:
+        return None
+    try:
+        return image.get_thumbnail(max(heights)).name
+    except ValidationError:
+        # image exceeds memory budget of renditions, it is left out
+        return None
+
+
+def export_entries(user, images):
+    """
+    ZIP entries of images user is allowed to access
+    :param user: requesting user
+    :param images: Image queryset
+    """
+    for image in images.iterator():
+        name = get_export_name(user, image)
+        if name is None:
+            continue
+        storage = image.image.storage
+        yield os.path.basename(name), lambda name=name: storage.open(name)
+
+
+def build_archive(export):
+    """
+    Writes ZIP archive of owner images to export.archive
+    :param export: Export instance
+    """
+    images = export.owner.image_set.all()
+    with tempfile.TemporaryFile() as archive:
+        for chunk in iter_zip(export_entries(export.owner, images)):
+            archive.write(chunk)
+        archive.seek(0)
+        export.archive.save(f'{export.name}.zip', File(archive))
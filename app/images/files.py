@@ -0,0 +1,103 @@
+import os
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from versatileimagefield.mixins import filter_regex, sizer_regex, filter_and_sizer_regex
+from versatileimagefield.settings import VERSATILEIMAGEFIELD_SIZED_DIRNAME, VERSATILEIMAGEFIELD_FILTERED_DIRNAME
+
+DELETE_BATCH_SIZE = 500
+
+
+def rendition_folders(name):
+    """
+    Returns (folder, regex) pairs where versatileimagefield stores renditions of file `name`
+    """
+    folder, filename = os.path.split(name)
+    sized_folder = os.path.join(VERSATILEIMAGEFIELD_SIZED_DIRNAME, folder, '')
+    return (
+        (os.path.join(folder, VERSATILEIMAGEFIELD_FILTERED_DIRNAME, ''), filter_regex),
+        (sized_folder, sizer_regex),
+        (os.path.join(sized_folder, VERSATILEIMAGEFIELD_FILTERED_DIRNAME), filter_and_sizer_regex),
+    )
+
+
+def created_image_names(storage, names):
+    """
+    Returns names of renditions created from `names`. Every rendition folder is listed once per call,
+    not once per image as in VersatileImageFieldFile.delete_all_created_images.
+    :param storage: storage of the image field
+    :param names: original file names
+    :return: list of rendition names
+    """
+    originals = defaultdict(dict)
+    for name in names:
+        basename, ext = os.path.splitext(os.path.basename(name))
+        for folder, regex in rendition_folders(name):
+            originals[(folder, regex)][basename] = ext
+
+    created = []
+    for (folder, regex), basenames in originals.items():
+        try:
+            file_list = storage.listdir(folder)[1]
+        except OSError:
+            continue
+        lengths = {len(basename) for basename in basenames}
+        for f in file_list:
+            for length in lengths:
+                ext = basenames.get(f[:length])
+                if ext is None or not f.endswith(ext):
+                    continue
+                if regex.match(f[length:len(f) - len(ext)]) is not None:
+                    created.append(os.path.join(folder, f))
+                    break
+    return created
+
+
+def delete_storage_files(storage, names):
+    """
+    Deletes files from storage. Storages that can remove many keys in one call (e.g. S3 DeleteObjects)
+    may provide delete_many(names), other storages delete files one by one.
+    """
+    delete_many = getattr(storage, 'delete_many', None)
+    for start in range(0, len(names), DELETE_BATCH_SIZE):
+        batch = names[start:start + DELETE_BATCH_SIZE]
+        if delete_many is not None:
+            delete_many(batch)
+        else:
+            for name in batch:
+                storage.delete(name)
+        # versatileimagefield caches rendition urls
+        cache.delete_many([storage.url(name) for name in batch])
+
+
+def delete_image_files(names):
+    """
+    Deletes original images and all their renditions
+    :param names: original file names
+    """
+    from .models import Image
+    storage = Image._meta.get_field('image').storage
+    delete_storage_files(storage, created_image_names(storage, names) + list(names))
+
+
+class PendingFileDeletion:
+    """
+    on_commit callback sending file names of one delete to celery, the task removes them in storage batches
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+
+    def __call__(self):
+        from Images_DRF.tasks import delete_files
+        for start in range(0, len(self.names), DELETE_BATCH_SIZE):
+            delete_files.delay(self.names[start:start + DELETE_BATCH_SIZE])
+
+
+def schedule_file_deletion(names, using=None):
+    """
+    Deletes files in celery worker after current transaction commits.
+    Every delete registers its own callback, so a rolled back savepoint drops exactly its files.
+    """
+    transaction.on_commit(PendingFileDeletion(names), using)
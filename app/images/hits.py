@@ -0,0 +1,129 @@
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from Images_DRF.counters import get_redis_client
+from django.db.models import F
+from django.utils import timezone
+
+
+class RedisLinkHits:
+    """
+    Hits of expiring links kept in redis. Every operation is a single round trip.
+    'links:uses:<id>' counts all uses of a link until it expires and enforces max_uses,
+    'links:pending' and 'links:last' hashes hold hits not yet flushed to the database.
+    """
+    PENDING = 'links:pending'
+    LAST = 'links:last'
+    # counts the hit only if the link is below max_uses, pending hits never include rejected ones
+    HIT = """
+        local uses = math.max(tonumber(redis.call('GET', KEYS[1]) or 0), tonumber(ARGV[4]))
+        local max_uses = tonumber(ARGV[3])
+        if max_uses and uses >= max_uses then
+            return 0
+        end
+        redis.call('SET', KEYS[1], uses + 1, 'EX', ARGV[2])
+        redis.call('HINCRBY', KEYS[2], ARGV[5], 1)
+        redis.call('HSET', KEYS[3], ARGV[5], ARGV[1])
+        return 1
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.hit_script = self.client.register_script(self.HIT)
+
+    def hit(self, link_id, now, timeout, max_uses, flushed):
+        """
+        :param flushed: hits already saved in the database, lower bound of uses lost with a redis restart
+        :return: False if link reached max_uses, the hit is not counted then
+        """
+        return bool(self.hit_script(keys=[f'links:uses:{link_id}', self.PENDING, self.LAST],
+                                    args=[now, timeout, '' if max_uses is None else max_uses, flushed, link_id]))
+
+    def pop_pending(self):
+        with self.client.pipeline() as pipe:
+            pipe.hgetall(self.PENDING)
+            pipe.delete(self.PENDING)
+            pipe.hgetall(self.LAST)
+            pipe.delete(self.LAST)
+            pending, _, last, _ = pipe.execute()
+        return {int(link_id): (int(count), float(last[link_id])) for link_id, count in pending.items()}
+
+
+class LocalLinkHits:
+    """
+    In-process link hits with the same semantics as RedisLinkHits, used when COUNTERS_REDIS_URL is not set.
+    Only for tests and development with a single process: hits of web processes are never seen
+    by flush_link_hits running in celery and max_uses is counted by every process separately.
+    """
+    # expired uses counters are removed at most this often
+    PRUNE_SECONDS = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._uses = {}
+        self._pending = {}
+        self._next_prune = 0
+
+    def hit(self, link_id, now, timeout, max_uses, flushed):
+        with self._lock:
+            if now >= self._next_prune:
+                self._uses = {key: uses for key, uses in self._uses.items() if uses[1] > now}
+                self._next_prune = now + self.PRUNE_SECONDS
+            uses = max(self._uses.get(link_id, (0, now))[0], flushed)
+            if max_uses is not None and uses >= max_uses:
+                return False
+            self._uses[link_id] = (uses + 1, now + timeout)
+            count, _ = self._pending.get(link_id, (0, now))
+            self._pending[link_id] = (count + 1, now)
+            return True
+
+    def pop_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def clear(self):
+        with self._lock:
+            self._uses.clear()
+            self._pending.clear()
+
+
+_link_hits = None
+_link_hits_lock = threading.Lock()
+
+
+def get_link_hits():
+    global _link_hits
+    if _link_hits is None:
+        with _link_hits_lock:
+            if _link_hits is None:
+                client = get_redis_client()
+                _link_hits = RedisLinkHits(client) if client else LocalLinkHits()
+    return _link_hits
+
+
+def record_hit(link):
+    """
+    Counts use of expiring link without writing to the database
+    :param link: ExpiringLink or CachedLink
+    :return: False if link reached max_uses, the hit is not counted then
+    """
+    now = timezone.now()
+    timeout = max(1, int((link.expiring - now).total_seconds()) + 1)
+    return get_link_hits().hit(link.pk, now.timestamp(), timeout, link.max_uses, link.hits)
+
+
+def flush_hits():
+    """
+    Moves pending hits to the database, one bulk update for all links
+    :return: number of updated links
+    """
+    from .models import ExpiringLink
+    pending = get_link_hits().pop_pending()
+    links = ExpiringLink.objects.only('pk').in_bulk(pending.keys())
+    for link_id, link in links.items():
+        count, last = pending[link_id]
+        link.hits = F('hits') + count
+        link.last_access = datetime.fromtimestamp(last, dt_timezone.utc)
+    ExpiringLink.objects.bulk_update(links.values(), ['hits', 'last_access'])
+    return len(links)
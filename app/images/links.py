@@ -0,0 +1,61 @@
+from collections import namedtuple
+
+from Images_DRF.cache import LocalCache
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+
+from .models import ExpiringLink
+
+# everything access_expiring needs, so hot links are served without database queries
+CachedLink = namedtuple('CachedLink', ('pk', 'storage_name', 'expiring', 'max_uses', 'hits'))
+
+local_links = LocalCache(max_size=1000)
+
+
+def _link_cache_key(name):
+    return f'images:link:{name}'
+
+
+def get_link(name):
+    """
+    Read-through cache of expiring links: process memory, then django cache shared by all processes, then database.
+    Entries live until the link expires, deleted links are invalidated by signals.
+    :param name: ExpiringLink.name
+    :return: CachedLink
+    """
+    link = local_links.get(name)
+    if link is not None:
+        return link
+
+    key = _link_cache_key(name)
+    link = cache.get(key)
+    if link is None:
+        instance = ExpiringLink.objects.filter(name=name).select_related('image').only(
+            'pk', 'expiring', 'max_uses', 'hits', 'image__image').first()
+        if instance is None:
+            raise Http404('No ExpiringLink matches the given query.')
+        link = CachedLink(instance.pk, instance.image.image.name, instance.expiring, instance.max_uses,
+                          instance.hits)
+        remaining = int((link.expiring - timezone.now()).total_seconds())
+        if remaining > 0:
+            cache.set(key, link, remaining)
+
+    remaining = (link.expiring - timezone.now()).total_seconds()
+    if remaining > 0:
+        local_links.set(name, link, min(remaining, settings.IMAGES.get('link_local_cache_seconds')))
+    return link
+
+
+def invalidate_link(name, using=None):
+    """
+    Removes link from django cache and from memory of this process once the transaction commits,
+    so no request caches it again from the old row. Other processes keep it for at most link_local_cache_seconds.
+    """
+    def invalidate():
+        local_links.delete(name)
+        cache.delete(_link_cache_key(name))
+
+    transaction.on_commit(invalidate, using=using)
@@ -0,0 +1,51 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Measure throughput and latency of a running server, e.g. runserver against gunicorn"
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help="e.g. http://localhost:8000/images/")
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--token', help="authenticate requests with this token")
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f"Token {options['token']}"} if options['token'] else {}
+        request = urllib.request.Request(options['url'], headers=headers)
+        # first request warms up lazy imports and caches of the server
+        self.fetch(request)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(self.fetch, [request] * options['requests']))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for ok, latency in results if ok)
+        errors = len(results) - len(latencies)
+        self.stdout.write(f"requests:   {len(results)}, errors: {errors}, concurrency: {options['concurrency']}")
+        self.stdout.write(f"throughput: {len(results) / elapsed:10.1f} requests/s")
+        if latencies:
+            percentiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(f"latency:    p50 {percentiles[49] * 1000:.1f} ms, p95 {percentiles[94] * 1000:.1f} ms, "
+                              f"p99 {percentiles[98] * 1000:.1f} ms")
+
+    @staticmethod
+    def fetch(request):
+        """
+        :return: (True if status was 2xx, seconds)
+        """
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return ok, time.perf_counter() - start
@@ -1,14 +1,18 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from images.models import ExpiringLink
+from images.models import ExpiringLink, Export
+from images.partitions import partitions_enabled, delete_expired_buckets
 
 
 class Command(BaseCommand):
-    help = "Delete expired links from database"
+    help = "Delete expired links and exports from database"
 
     def handle(self, *args, **options):
         now = timezone.now()
+        if partitions_enabled():
+            # whole expired hours at once, rows of current hour are deleted below
+            self.stdout.write(f"{delete_expired_buckets(now)} just got deleted.")
         expired_links = ExpiringLink.objects.filter(expiring__lte=now)
         if expired_links:
             count = expired_links.count()
@@ -16,3 +20,9 @@ class Command(BaseCommand):
             self.stdout.write(f"{count} expired links just got deleted.")
         else:
             self.stdout.write("No expired links to delete.")
+
+        expired_exports = Export.objects.filter(expiring__lte=now)
+        if expired_exports:
+            count = expired_exports.count()
+            expired_exports.delete()
+            self.stdout.write(f"{count} expired exports just got deleted.")
@@ -0,0 +1,76 @@
+import os
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from versatileimagefield.mixins import filter_regex, sizer_regex, filter_and_sizer_regex
+from versatileimagefield.settings import VERSATILEIMAGEFIELD_SIZED_DIRNAME, VERSATILEIMAGEFIELD_FILTERED_DIRNAME
+
+from images.converters import key_from_name
+from images.files import delete_storage_files, DELETE_BATCH_SIZE
+from images.models import Image, Export
+
+
+class Command(BaseCommand):
+    help = "Delete images, renditions and export archives under MEDIA_ROOT that do not belong to any Image or Export"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help="Skip files modified in the last MIN_AGE seconds (uploads in progress)")
+        parser.add_argument('--dry-run', action='store_true', help="Only list orphaned files")
+
+    def handle(self, *args, **options):
+        storage = Image._meta.get_field('image').storage
+        modified_before = timezone.now() - timezone.timedelta(seconds=options['min_age'])
+        # folder and function returning orphaned files of a batch of its names,
+        # renditions are matched by pattern of names after the key, originals have none
+        folders = (
+            ('', partial(self.get_orphaned, suffix_regex=None)),
+            (VERSATILEIMAGEFIELD_FILTERED_DIRNAME, partial(self.get_orphaned, suffix_regex=filter_regex)),
+            (VERSATILEIMAGEFIELD_SIZED_DIRNAME, partial(self.get_orphaned, suffix_regex=sizer_regex)),
+            (os.path.join(VERSATILEIMAGEFIELD_SIZED_DIRNAME, VERSATILEIMAGEFIELD_FILTERED_DIRNAME),
+             partial(self.get_orphaned, suffix_regex=filter_and_sizer_regex)),
+            (Export._meta.get_field('archive').upload_to.sub_path, self.get_orphaned_archives),
+        )
+        count = 0
+        for folder, get_orphaned in folders:
+            try:
+                file_list = storage.listdir(folder)[1]
+            except OSError:
+                continue
+            names = [os.path.join(folder, f) for f in file_list]
+            for start in range(0, len(names), DELETE_BATCH_SIZE):
+                orphaned = get_orphaned(storage, names[start:start + DELETE_BATCH_SIZE], modified_before)
+                for name in orphaned:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    delete_storage_files(storage, orphaned)
+                count += len(orphaned)
+
+        if options['dry_run']:
+            self.stdout.write(f"{count} orphaned files found.")
+        else:
+            self.stdout.write(f"{count} orphaned files just got deleted.")
+
+    @staticmethod
+    def get_orphaned(storage, names, modified_before, suffix_regex):
+        """
+        Files are named after Image.key (renditions add a suffix), one indexed query checks the whole batch.
+        Names that are not exactly a key and a rendition suffix are never deleted.
+        """
+        keys = {}
+        for name in names:
+            key = key_from_name(name, suffix_regex)
+            if key is not None:
+                keys[name] = key
+        existing = set(Image.objects.filter(key__in=set(keys.values())).values_list('key', flat=True))
+        return [name for name, key in keys.items()
+                if key not in existing and storage.get_modified_time(name) < modified_before]
+
+    @staticmethod
+    def get_orphaned_archives(storage, names, modified_before):
+        """
+        Export archives are matched by their whole name, exports table holds only exports that did not expire
+        """
+        existing = set(Export.objects.filter(archive__in=names).values_list('archive', flat=True))
+        return [name for name in names if name not in existing and storage.get_modified_time(name) < modified_before]
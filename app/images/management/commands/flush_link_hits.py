@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from images.hits import flush_hits
+
+
+class Command(BaseCommand):
+    help = "Save expiring link hits counted in fast counters to database"
+
+    def handle(self, *args, **options):
+        count = flush_hits()
+        self.stdout.write(f"Hits of {count} links just got saved.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from images.partitions import is_partitioned_table, partition_table
+
+
+class Command(BaseCommand):
+    help = "Convert expiring links table to hourly partitions (PostgreSQL), expired links are not copied"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write("Partitioning requires PostgreSQL, expired hours are deleted with single statements.")
+        elif is_partitioned_table():
+            self.stdout.write("Expiring links table is already partitioned.")
+        else:
+            partition_table(timezone.now())
+            self.stdout.write("Expiring links table is partitioned by hour.")
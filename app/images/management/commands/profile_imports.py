@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# what a process imports before it is ready for its first request or task
+TARGETS = {
+    'web': "import Images_DRF.wsgi; from django.urls import get_resolver; get_resolver().url_patterns",
+    'worker': "import django; django.setup(); from Images_DRF.celery import app; app.loader.import_default_modules()",
+}
+
+# packages that should only be imported by processes sending or running tasks
+LAZY_PACKAGES = ('celery', 'kombu', 'billiard', 'redis')
+
+
+class Command(BaseCommand):
+    help = "Profile imports of a fresh web or worker process with python -X importtime"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=TARGETS, default='web')
+        parser.add_argument('--top', type=int, default=15, help="number of packages listed")
+        parser.add_argument('--repeat', type=int, default=3, help="fastest of repeated runs is reported")
+
+    def handle(self, *args, **options):
+        runs = [self.profile(TARGETS[options['target']]) for _ in range(options['repeat'])]
+        modules = min(runs, key=lambda run: sum(run.values()))
+        packages = defaultdict(int)
+        for name, self_us in modules.items():
+            packages[name.partition('.')[0]] += self_us
+
+        self.stdout.write(f"{options['target']}: {sum(modules.values()) / 1000:.1f} ms, {len(modules)} modules")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{self_us / 1000:10.1f} ms  {package}")
+        imported = [package for package in LAZY_PACKAGES if package in packages]
+        if options['target'] == 'web' and imported:
+            self.stdout.write(self.style.WARNING(f"imported at start: {', '.join(imported)}"))
+
+    @staticmethod
+    def profile(code):
+        """
+        :return: dict of module name and its own import time in microseconds
+        """
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'Images_DRF.settings')}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or line.endswith('imported package'):
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(self_us)
+        return modules
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.9 on 2026-10-19 14:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import images.models
+import versatileimagefield.fields
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Image',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', versatileimagefield.fields.VersatileImageField(height_field='height', upload_to=images.models.UploadToPathAndRename(''), width_field='width')),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExpiringLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default=images.models.uuid4_hex, max_length=40)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, null=True)),
+                ('expiring', models.DateTimeField()),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='images.image')),
+            ],
+        ),
+    ]
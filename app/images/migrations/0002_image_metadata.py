@@ -0,0 +1,35 @@
+# Generated by Django 3.2.9 on 2026-10-19 14:47
+
+from django.db import migrations, models
+import images.models
+import versatileimagefield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='format',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='mode',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='image',
+            field=versatileimagefield.fields.VersatileImageField(upload_to=images.models.UploadToPathAndRename('')),
+        ),
+    ]
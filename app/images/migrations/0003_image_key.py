@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Key is backfilled and made unique in 0006 and 0007, outside of a single schema transaction
+    """
+
+    dependencies = [
+        ('images', '0002_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='key',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+    ]
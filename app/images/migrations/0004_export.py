@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-19 14:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import images.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('images', '0003_image_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Export',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default=images.models.uuid4_hex, max_length=40, unique=True)),
+                ('archive', models.FileField(blank=True, upload_to=images.models.UploadToPathAndRename('exports'))),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expiring', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.9 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0004_export'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expiringlink',
+            name='hits',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='expiringlink',
+            name='last_access',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='expiringlink',
+            name='max_uses',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import os
+import uuid
+
+from django.db import migrations
+
+from images.converters import key_from_name
+from images.files import created_image_names, delete_storage_files
+
+BATCH_SIZE = 2000
+
+
+def rename_file(storage, image):
+    """
+    Copies file of image without a key in its name to '<key hex>.<extension>', so it is served by the new URLs
+    :return: new name or None if the file could not be copied
+    """
+    old = image.image.name
+    folder, filename = os.path.split(old)
+    try:
+        with storage.open(old) as file:
+            return storage.save(os.path.join(folder, f'{image.key.hex}{os.path.splitext(filename)[1]}'), file)
+    except OSError:
+        return None
+
+
+def backfill_keys(apps, schema_editor):
+    """
+    Files were always stored as '<uuid4 hex>.<extension>', so existing media URLs keep working.
+    Files named otherwise get a new key and are renamed after it, rows whose file can not be renamed are listed.
+    Table is walked in primary key ranges, every batch is committed on its own.
+    """
+    Image = apps.get_model('images', 'Image')
+    storage = Image._meta.get_field('image').storage
+    last = 0
+    while True:
+        batch = list(Image.objects.filter(pk__gt=last).order_by('pk').only('pk', 'image', 'key')[:BATCH_SIZE])
+        if not batch:
+            break
+        last = batch[-1].pk
+        missing = [image for image in batch if image.key is None]
+        renamed = {}
+        for image in missing:
+            image.key = key_from_name(image.image.name)
+            if image.key is None:
+                image.key = uuid.uuid4()
+                new_name = rename_file(storage, image)
+                if new_name is None:
+                    print(f"\n  image {image.pk}: file '{image.image.name}' could not be renamed "
+                          f"to key {image.key.hex}, rename it by hand")
+                    continue
+                renamed[image.image.name] = new_name
+                image.image = new_name
+        Image.objects.bulk_update(missing, ['key', 'image'])
+        # old files are removed only after rows point to the new ones
+        delete_storage_files(storage, created_image_names(storage, list(renamed)) + list(renamed))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('images', '0005_expiringlink_hits'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def key_field():
+    field = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    field.set_attributes_from_name('key')
+    return field
+
+
+def make_key_unique(apps, schema_editor):
+    """
+    On PostgreSQL the unique index is built concurrently, without locking the table against writes.
+    """
+    Image = apps.get_model('images', 'Image')
+    table = Image._meta.db_table
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        new_field = key_field()
+        new_field.model = Image
+        schema_editor.alter_field(Image, Image._meta.get_field('key'), new_field)
+        return
+    quote = schema_editor.quote_name
+    index = f'{table}_key_uniq'
+    schema_editor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {quote(index)} ON {quote(table)} (key)')
+    schema_editor.execute(f'ALTER TABLE {quote(table)} ALTER COLUMN key SET NOT NULL')
+    schema_editor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(index)} UNIQUE USING INDEX {quote(index)}')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('images', '0006_image_key_backfill'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(make_key_unique, migrations.RunPython.noop)],
+            state_operations=[migrations.AlterField(model_name='image', name='key', field=key_field())],
+        ),
+    ]
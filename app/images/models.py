@@ -8,6 +8,8 @@ from django.utils import timezone
 from django.utils.deconstruct import deconstructible
 from versatileimagefield.fields import VersatileImageField
 
+from .processing import read_metadata
+
 
 @deconstructible
 class UploadToPathAndRename(object):
@@ -17,7 +19,9 @@ class UploadToPathAndRename(object):
 
     def __call__(self, instance, filename):
         extension = filename.split('.')[-1]
-        filename = f'{uuid4_hex()}.{extension}'
+        # file name doubles as lookup key of the instance, see Image.key
+        key = getattr(instance, 'key', None)
+        filename = f'{key.hex if key else uuid4_hex()}.{extension}'
         return os.path.join(self.sub_path, filename)
 
 
@@ -27,19 +31,47 @@ def uuid4_hex():
 
 class Image(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
-    image = VersatileImageField(upload_to=UploadToPathAndRename(''), height_field='height', width_field='width')
+    key = models.UUIDField(default=uuid4, unique=True, editable=False)
+    image = VersatileImageField(upload_to=UploadToPathAndRename(''))
     width = models.PositiveIntegerField(blank=True, null=True)
     height = models.PositiveIntegerField(blank=True, null=True)
+    format = models.CharField(max_length=10, blank=True)
+    mode = models.CharField(max_length=10, blank=True)
+    orientation = models.PositiveSmallIntegerField(default=1)
 
     def __str__(self):
         return self.image.name
 
+    def save(self, *args, **kwargs):
+        # metadata is read once from the header of a new file and never from the storage again
+        if self.image and self.width is None:
+            self.set_metadata(read_metadata(self.image))
+        super().save(*args, **kwargs)
+
+    def set_metadata(self, metadata):
+        self.format = metadata.format
+        self.width = metadata.width
+        self.height = metadata.height
+        self.orientation = metadata.orientation
+        self.mode = metadata.mode
+
+    def get_thumbnail(self, height):
+        """
+        Returns sized image of given height, it is created on first access
+        """
+        new_width = height * self.width // self.height
+        return self.image.thumbnail[f'{height}x{new_width}']
+
 
 class ExpiringLink(models.Model):
     image = models.ForeignKey(Image, on_delete=models.CASCADE)
     name = models.CharField(default=uuid4_hex, max_length=40)
     created = models.DateTimeField(default=timezone.now, null=True)
     expiring = models.DateTimeField()
+    max_uses = models.PositiveIntegerField(blank=True, null=True)
+    # flushed periodically from fast counters, see images.hits
+    hits = models.PositiveBigIntegerField(default=0)
+    last_access = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return f'{self.image} link expiring in {self.expiring}'
@@ -49,3 +81,17 @@ class ExpiringLink(models.Model):
 
     def get_absolute_url(self):
         return reverse('get-expiring', kwargs={'name': self.name})
+
+
+class Export(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(default=uuid4_hex, max_length=40, unique=True)
+    archive = models.FileField(upload_to=UploadToPathAndRename('exports'), blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    expiring = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.owner} export expiring in {self.expiring}'
+
+    def get_absolute_url(self):
+        return reverse('get-export', kwargs={'name': self.name})
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import ExpiringLink
+
+BUCKET = timedelta(hours=1)
+PARTITION_PREFIX = f'{ExpiringLink._meta.db_table}_p'
+DEFAULT_PARTITION = f'{ExpiringLink._meta.db_table}_default'
+
+
+def partitions_enabled():
+    return bool(settings.IMAGES.get('link_partitions'))
+
+
+def is_partitioned_table():
+    """
+    True if links table was converted with partition_expiring_links command (postgres only)
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+                       [ExpiringLink._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def bucket_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def partition_name(start):
+    return f'{PARTITION_PREFIX}{start:%Y%m%d%H}'
+
+
+def partition_names(cursor):
+    """
+    Returns names of all partitions of links table, including the default one
+    """
+    cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                   "WHERE i.inhparent = %s::regclass", [ExpiringLink._meta.db_table])
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition_statements(start):
+    """
+    Returns (sql, params) statements creating partition of hour `start`. Postgres rejects a new partition
+    while the default partition holds rows of its range, so they are moved to the new table before it is attached.
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(ExpiringLink._meta.db_table)
+    default = quote_name(DEFAULT_PARTITION)
+    partition = quote_name(partition_name(start))
+    end = start + BUCKET
+    return [
+        # no rows of the range can be added to the default partition until the new one is attached
+        (f"LOCK TABLE {default} IN SHARE ROW EXCLUSIVE MODE", []),
+        (f"CREATE TABLE {partition} (LIKE {table} INCLUDING ALL)", []),
+        (f"WITH moved AS (DELETE FROM {default} WHERE expiring >= %s AND expiring < %s RETURNING *) "
+         f"INSERT INTO {partition} SELECT * FROM moved", [start, end]),
+        (f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s)", [start, end]),
+    ]
+
+
+def ensure_partitions(now):
+    """
+    Creates hourly partitions from current hour until the longest link that can be created now expires
+    """
+    start = bucket_start(now)
+    end = now + timedelta(seconds=settings.IMAGES.get('max_seconds')) + BUCKET
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = partition_names(cursor)
+        while start < end:
+            if partition_name(start) not in existing:
+                for sql, params in create_partition_statements(start):
+                    cursor.execute(sql, params)
+            start += BUCKET
+
+
+def drop_expired_partitions(now):
+    """
+    Drops hourly partitions whose every link has expired
+    :return: number of dropped partitions
+    """
+    current = bucket_start(now)
+    with connection.cursor() as cursor:
+        expired = [name for name in partition_names(cursor) if name.startswith(PARTITION_PREFIX)
+                   and datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d%H').replace(
+                       tzinfo=dt_timezone.utc) + BUCKET <= current]
+        for name in expired:
+            cursor.execute(f"DROP TABLE {connection.ops.quote_name(name)}")
+    return len(expired)
+
+
+def delete_expired_buckets(now):
+    """
+    Removes links of hours that are completely expired, instead of deleting them row by row.
+    Postgres partitioned table drops whole partitions, other databases delete the time range
+    with a single statement, without fetching rows or sending signals.
+    :return: description of what was removed
+    """
+    if is_partitioned_table():
+        with transaction.atomic():
+            count = drop_expired_partitions(now)
+            ensure_partitions(now)
+        return f"{count} expired partitions"
+    table = connection.ops.quote_name(ExpiringLink._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE expiring < %s", [bucket_start(now)])
+        return f"{cursor.rowcount} links in expired buckets"
+
+
+def partition_table(now):
+    """
+    Recreates links table partitioned by hourly ranges of 'expiring', copies links that did not expire.
+    Primary key becomes (id, expiring) as postgres requires partition key in unique constraints.
+    """
+    table = ExpiringLink._meta.db_table
+    quoted = connection.ops.quote_name(table)
+    old = connection.ops.quote_name(f'{table}_old')
+    image_table = connection.ops.quote_name(ExpiringLink._meta.get_field('image').related_model._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {quoted} RENAME TO {old}")
+        # indexes are not copied, primary key of old table does not include the partition key
+        cursor.execute(f"CREATE TABLE {quoted} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                       f"PARTITION BY RANGE (expiring)")
+        cursor.execute(f"ALTER TABLE {quoted} ADD PRIMARY KEY (id, expiring)")
+        cursor.execute(f"CREATE INDEX ON {quoted} (id)")
+        cursor.execute(f"CREATE INDEX ON {quoted} (image_id)")
+        cursor.execute(f"ALTER TABLE {quoted} ADD FOREIGN KEY (image_id) REFERENCES {image_table} (id) "
+                       f"DEFERRABLE INITIALLY DEFERRED")
+        # keep id sequence when old table is dropped
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [f'{table}_old'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {quoted}.id")
+        cursor.execute(f"CREATE TABLE {connection.ops.quote_name(DEFAULT_PARTITION)} PARTITION OF {quoted} DEFAULT")
+        ensure_partitions(now)
+        cursor.execute(f"INSERT INTO {quoted} SELECT * FROM {old} WHERE expiring > %s", [now])
+        # deferred foreign key checks of rows changed earlier in the transaction would block the drop
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"DROP TABLE {old}")
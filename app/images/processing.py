@@ -0,0 +1,219 @@
+import io
+import struct
+import tempfile
+from collections import namedtuple
+
+from PIL import Image as PIL_Image, ImageOps
+from accounts.tiers import UNLIMITED, get_request_tier
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+
+ORIENTATION_TAG = 0x0112
+
+FORMAT_CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+FORMAT_EXTENSIONS = {
+    'JPEG': ('jpg', 'jpeg'),
+    'PNG': ('png',),
+}
+
+# bytes per pixel of decoded image in Pillow, other modes take 4 bytes
+MODE_BYTES = {
+    '1': 1,
+    'L': 1,
+    'P': 1,
+    'I;16': 2,
+    'I;16B': 2,
+    'I;16L': 2,
+}
+
+ImageMetadata = namedtuple('ImageMetadata', ('format', 'width', 'height', 'orientation', 'mode'))
+
+ImageBudget = namedtuple('ImageBudget', ('max_pixels', 'max_decoded_bytes'))
+
+
+def read_metadata(file):
+    """
+    Reads format, dimensions, EXIF orientation and color mode from the image header.
+    Pillow opens images lazily, so pixel data is never decoded here.
+    :param file: file-like object, its position is restored afterwards
+    :return: ImageMetadata
+    """
+    position = file.tell()
+    file.seek(0)
+    try:
+        with PIL_Image.open(file) as image:
+            width, height = image.size
+            return ImageMetadata(image.format, width, height, _read_orientation(image), image.mode)
+    except (OSError, SyntaxError, PIL_Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image. The file you uploaded was either not an image or a corrupted image.')
+    finally:
+        file.seek(position)
+
+
+def _read_orientation(image):
+    """
+    Reads orientation from EXIF already parsed with the header (JPEG APP1, PNG eXIf before IDAT)
+    """
+    exif_bytes = image.info.get('exif')
+    if not exif_bytes:
+        return 1
+    exif = PIL_Image.Exif()
+    try:
+        exif.load(exif_bytes)
+    except (OSError, SyntaxError, struct.error):
+        return 1
+    orientation = exif.get(ORIENTATION_TAG, 1)
+    return orientation if orientation in range(1, 9) else 1
+
+
+def decoded_size(width, height, mode):
+    """
+    Memory taken by pixel data of decoded image
+    """
+    return width * height * MODE_BYTES.get(mode, 4)
+
+
+def _lowest(*limits):
+    limits = [limit for limit in limits if limit is not UNLIMITED]
+    return min(limits) if limits else UNLIMITED
+
+
+def get_budget(request=None):
+    """
+    Limits of images from IMAGES settings, lowered by limits of uploading user's account tier
+    :param request: upload request, None for global limits only
+    :return: ImageBudget, UNLIMITED values are not checked
+    """
+    max_pixels = settings.IMAGES.get('max_pixels')
+    max_decoded_bytes = settings.IMAGES.get('max_decoded_bytes')
+    if request is not None and request.user.is_authenticated and not request.user.is_staff:
+        limits = get_request_tier(request).limits
+        if limits.max_megapixels is not UNLIMITED:
+            max_pixels = _lowest(max_pixels, limits.max_megapixels * 1_000_000)
+        max_decoded_bytes = _lowest(max_decoded_bytes, limits.max_decoded_bytes)
+    return ImageBudget(max_pixels, max_decoded_bytes)
+
+
+def check_budget(width, height, mode, budget):
+    """
+    Raises ValidationError if image of given dimensions would not fit into budget once decoded
+    """
+    if budget.max_pixels is not UNLIMITED and width * height > budget.max_pixels:
+        raise ValidationError(f'Image has {width}x{height} pixels, maximum is {budget.max_pixels} pixels')
+    size = decoded_size(width, height, mode)
+    if budget.max_decoded_bytes is not UNLIMITED and size > budget.max_decoded_bytes:
+        raise ValidationError(f'Image takes {size} bytes decoded, maximum is {budget.max_decoded_bytes} bytes')
+
+
+def preprocess_upload(file, content_type, budget=None):
+    """
+    Validates uploaded image against its header and normalizes it before it is stored.
+    Rejects files whose content does not match declared content type or extension or exceeds the budget.
+    Rotates images according to EXIF orientation ('auto_orient') and optionally strips EXIF ('strip_exif').
+    :param file: UploadedFile
+    :param content_type: content type declared by the client
+    :param budget: ImageBudget of uploading user, global limits if not given
+    :return: UploadedFile that should be stored
+    """
+    metadata = read_metadata(file)
+    if FORMAT_CONTENT_TYPES.get(metadata.format) != content_type:
+        raise ValidationError(f'File content ({metadata.format}) does not match declared type {content_type}')
+    extension = file.name.split('.')[-1].lower()
+    if extension not in FORMAT_EXTENSIONS[metadata.format]:
+        raise ValidationError(f'File content ({metadata.format}) does not match extension .{extension}')
+
+    check_budget(metadata.width, metadata.height, metadata.mode, budget or get_budget())
+
+    strip = settings.IMAGES.get('strip_exif', False)
+    if settings.IMAGES.get('auto_orient', True) and metadata.orientation != 1:
+        return _auto_orient(file, metadata, strip)
+    if strip:
+        return strip_exif(file, metadata.format)
+    return file
+
+
+def _auto_orient(file, metadata, strip):
+    """
+    Applies EXIF orientation to pixel data. This is the only path that needs a full decode.
+    """
+    file.seek(0)
+    with PIL_Image.open(file) as image:
+        oriented = ImageOps.exif_transpose(image)
+        options = {}
+        if metadata.format == 'JPEG':
+            options['quality'] = settings.IMAGES.get('jpeg_quality', 90)
+        if 'icc_profile' in image.info:
+            options['icc_profile'] = image.info['icc_profile']
+        if not strip and oriented.info.get('exif'):
+            options['exif'] = oriented.info['exif']
+        buffer = io.BytesIO()
+        oriented.save(buffer, metadata.format, **options)
+    return _uploaded_file(buffer, file)
+
+
+def strip_exif(file, image_format):
+    """
+    Removes EXIF segments (JPEG APP1, PNG eXIf) by copying the file segment by segment, without decoding it.
+    """
+    file.seek(0)
+    output = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    if image_format == 'JPEG':
+        _copy_jpeg_without_exif(file, output)
+    elif image_format == 'PNG':
+        _copy_png_without_exif(file, output)
+    else:
+        return file
+    return _uploaded_file(output, file)
+
+
+def _copy_jpeg_without_exif(source, output):
+    output.write(source.read(2))  # SOI
+    while True:
+        marker = source.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            output.write(marker)
+            break
+        # start of scan, the rest is entropy-coded data
+        if marker[1] == 0xDA:
+            output.write(marker)
+            break
+        length_bytes = source.read(2)
+        payload = source.read(struct.unpack('>H', length_bytes)[0] - 2)
+        if marker[1] == 0xE1 and payload.startswith(b'Exif\x00\x00'):
+            continue
+        output.write(marker + length_bytes + payload)
+    _copy_rest(source, output)
+
+
+def _copy_png_without_exif(source, output):
+    output.write(source.read(8))  # signature
+    while True:
+        header = source.read(8)
+        if len(header) < 8:
+            output.write(header)
+            break
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'IDAT':
+            output.write(header)
+            break
+        body = source.read(length + 4)  # data + crc
+        if chunk_type == b'eXIf':
+            continue
+        output.write(header + body)
+    _copy_rest(source, output)
+
+
+def _copy_rest(source, output):
+    for chunk in iter(lambda: source.read(64 * 1024), b''):
+        output.write(chunk)
+
+
+def _uploaded_file(content, original):
+    size = content.tell()
+    content.seek(0)
+    return UploadedFile(content, original.name, original.content_type, size, original.charset)
@@ -2,7 +2,8 @@ from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Image, ExpiringLink
+from .models import Image, ExpiringLink, Export
+from .processing import get_budget, preprocess_upload
 
 
 class ImageSerializer(serializers.Serializer):
@@ -16,13 +17,20 @@ class ImageSerializer(serializers.Serializer):
         validated_data['owner'] = self.context['request'].user
         return Image.objects.create(**validated_data)
 
+    def to_internal_value(self, data):
+        # django ImageField replaces content type of the file with the one detected by Pillow
+        self.declared_content_type = getattr(data.get('image'), 'content_type', None)
+        return super().to_internal_value(data)
+
     def validate_image(self, value):
         """
-        Make sure the image is in jpg/png format
+        Make sure the image is in jpg/png format, its header matches content type declared by the client
+        and it fits into image limits of user's tier
         """
-        if value.content_type not in ['image/jpeg', 'image/png']:
-            raise serializers.ValidationError(f'{value.content_type} is not supported')
-        return value
+        content_type = self.declared_content_type
+        if content_type not in ['image/jpeg', 'image/png']:
+            raise serializers.ValidationError(f'{content_type} is not supported')
+        return preprocess_upload(value, content_type, get_budget(self.context['request']))
 
 
 class ExpiringLinkSerializer(serializers.ModelSerializer):
@@ -31,10 +39,13 @@ class ExpiringLinkSerializer(serializers.ModelSerializer):
     expiring = serializers.DateTimeField(read_only=True)
     seconds = serializers.IntegerField(write_only=True, max_value=settings.IMAGES.get('max_seconds'),
                                        min_value=settings.IMAGES.get('min_seconds'))
+    max_uses = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    hits = serializers.IntegerField(read_only=True)
+    last_access = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = ExpiringLink
-        fields = ('created', 'url', 'expiring', 'image', 'seconds')
+        fields = ('created', 'url', 'expiring', 'image', 'seconds', 'max_uses', 'hits', 'last_access')
 
     def create(self, validated_data):
         validated_data['expiring'] = timezone.now() + timezone.timedelta(seconds=validated_data.pop('seconds'))
@@ -43,3 +54,28 @@ class ExpiringLinkSerializer(serializers.ModelSerializer):
     def get_url(self, obj):
         url = self.context['request'].build_absolute_uri(obj.get_absolute_url())
         return url
+
+
+class ExportSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField(read_only=True)
+    ready = serializers.SerializerMethodField(read_only=True)
+    created = serializers.DateTimeField(read_only=True)
+    expiring = serializers.DateTimeField(read_only=True)
+    seconds = serializers.IntegerField(write_only=True, max_value=settings.IMAGES.get('max_seconds'),
+                                       min_value=settings.IMAGES.get('min_seconds'))
+
+    class Meta:
+        model = Export
+        fields = ('created', 'url', 'ready', 'expiring', 'seconds')
+
+    def create(self, validated_data):
+        validated_data['owner'] = self.context['request'].user
+        validated_data['expiring'] = timezone.now() + timezone.timedelta(seconds=validated_data.pop('seconds'))
+        return Export.objects.create(**validated_data)
+
+    def get_url(self, obj):
+        url = self.context['request'].build_absolute_uri(obj.get_absolute_url())
+        return url
+
+    def get_ready(self, obj):
+        return bool(obj.archive)
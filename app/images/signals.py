@@ -1,14 +1,34 @@
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Image
+
+from .files import schedule_file_deletion
+from .links import invalidate_link
+from .models import Image, Export, ExpiringLink
 
 
 @receiver(post_delete, sender=Image)
 def delete_files(sender, instance, using, **kwargs):
     """
-    Deletes Image image renditions on post_delete.
+    Schedules deletion of Image image and its renditions after transaction commits.
+    """
+    if instance.image.name:
+        schedule_file_deletion([instance.image.name], using)
+
+
+@receiver(post_save, sender=ExpiringLink)
+@receiver(post_delete, sender=ExpiringLink)
+def invalidate_cached_link(sender, instance, using, **kwargs):
+    """
+    Invalidates cached link on change and on delete, including cascade from Image delete.
     """
-    # Deletes Thumbnails
-    instance.image.delete_all_created_images()
-    # Deletes Original Image
-    instance.image.delete(save=False)
+    invalidate_link(instance.name, using)
+
+
+@receiver(post_delete, sender=Export)
+def delete_archive(sender, instance, using, **kwargs):
+    """
+    Schedules deletion of Export archive after transaction commits.
+    """
+    if instance.archive.name:
+        schedule_file_deletion([instance.archive.name], using)
+
@@ -1,16 +1,43 @@
 import io
+import os
+import struct
+import subprocess
+import sys
 import tempfile
+import zipfile
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock, skipUnless
+from uuid import uuid4
 
-from PIL import Image as PIL_Image
+from Images_DRF.tasks import build_export, delete_files
+from PIL import Image as PIL_Image, ImageFile as PIL_ImageFile
+from accounts.models import Account, Perk, Tier
+from accounts.throttling import get_counters
+from accounts.tiers import get_tier, local_tiers
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.files.base import File
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.base import ContentFile, File
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.core.files.uploadedfile import InMemoryUploadedFile, SimpleUploadedFile
+from django.test import SimpleTestCase
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
-from .models import Image, ExpiringLink
+from .access import can_access
+from .hits import get_link_hits
+from .links import get_link, local_links
+from .management.commands.profile_imports import LAZY_PACKAGES, TARGETS
+from .models import Image, ExpiringLink, Export
+from .partitions import bucket_start, create_partition_statements, delete_expired_buckets, \
+    is_partitioned_table, partition_name, partition_table
+from .processing import ORIENTATION_TAG
+from .versatileimagefield import BoundedThumbnailImage
 
 client = APIClient()
 
@@ -33,6 +60,14 @@ class APITestCaseWithMedia(APITestCase):
         cls.temporary_dir = None
         super(APITestCaseWithMedia, cls).tearDownClass()
 
+    def setUp(self):
+        # cached tiers and counters would survive rolled back fixture changes
+        cache.clear()
+        get_counters().clear()
+        get_link_hits().clear()
+        local_links.clear()
+        local_tiers.clear()
+
     def _get_temporary_image(self, size, extension='jpeg', temp_file=None):
         """
         creates NamedTemporaryFile and stores image created with PIL in it
@@ -48,6 +83,19 @@ class APITestCaseWithMedia(APITestCase):
         temp_file.seek(0)
         return temp_file
 
+    def _get_png_header(self, size):
+        """
+        creates PNG with valid header of given dimensions and no pixel data, decoding it would fail
+        :param size: (width, height) tuple
+        :return: BytesIO object
+        """
+        def chunk(chunk_type, data):
+            return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+        ihdr = struct.pack('>IIBBBBB', *size, 8, 2, 0, 0, 0)
+        return io.BytesIO(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', zlib.compress(b'')) +
+                          chunk(b'IEND', b''))
+
     def _create_image(self, auth, size=(200, 200)):
         """
         need to be invoked inside:
@@ -129,6 +177,217 @@ class ExpiringLinksTest(APITestCaseWithMedia):
             self.assertEqual(ExpiringLink.objects.all().count(), 0)
 
 
+class ExpiringLinkHitsTest(APITestCaseWithMedia):
+    """
+    Test counting expiring link hits
+    """
+    fixtures = ['accounts.json']
+
+    def _create_link(self, **kwargs):
+        image = self._create_image(('chessGM', 'YUsPygfgf8rLaU7'))
+        expiring = timezone.now() + timezone.timedelta(seconds=300)
+        return ExpiringLink.objects.create(image=image, expiring=expiring, **kwargs)
+
+    def test_hits_flushed(self):
+        """
+        Hits are counted without database writes and saved by flush_link_hits command
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link()
+            for _ in range(3):
+                response = client.get(link.get_absolute_url())
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            link.refresh_from_db()
+            self.assertEqual(link.hits, 0)
+
+            call_command('flush_link_hits', stdout=io.StringIO())
+            link.refresh_from_db()
+            self.assertEqual(link.hits, 3)
+            self.assertIsNotNone(link.last_access)
+
+            client.get(link.get_absolute_url())
+            call_command('flush_link_hits', stdout=io.StringIO())
+            link.refresh_from_db()
+            self.assertEqual(link.hits, 4)
+
+    def test_max_uses(self):
+        """
+        Link can not be used more than max_uses times
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link(max_uses=2)
+            responses = [client.get(link.get_absolute_url()) for _ in range(3)]
+            self.assertEqual([response.status_code for response in responses],
+                             [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_410_GONE])
+            call_command('flush_link_hits', stdout=io.StringIO())
+            link.refresh_from_db()
+            self.assertEqual(link.hits, 2)
+
+    def test_rejected_hits_not_pending(self):
+        """
+        Hits over max_uses are not counted, also after pending hits were flushed
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link(max_uses=1)
+            self.assertEqual(client.get(link.get_absolute_url()).status_code, status.HTTP_200_OK)
+            call_command('flush_link_hits', stdout=io.StringIO())
+            self.assertEqual(client.get(link.get_absolute_url()).status_code, status.HTTP_410_GONE)
+            self.assertEqual(get_link_hits().pop_pending(), {})
+            link.refresh_from_db()
+            self.assertEqual(link.hits, 1)
+
+    def test_list_hits(self):
+        """
+        Links list exposes hits and max uses
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link(max_uses=5)
+            client.get(link.get_absolute_url())
+            call_command('flush_link_hits', stdout=io.StringIO())
+            client.login(username='chessGM', password='YUsPygfgf8rLaU7')
+            response = client.get(reverse('expiring-list'))
+            client.logout()
+            self.assertEqual(response.json()[0]['hits'], 1)
+            self.assertEqual(response.json()[0]['max_uses'], 5)
+
+
+class ExpiringLinkCacheTest(APITestCaseWithMedia):
+    """
+    Test serving expiring links from cache
+    """
+    fixtures = ['accounts.json']
+
+    def _create_link(self):
+        image = self._create_image(('chessGM', 'YUsPygfgf8rLaU7'))
+        expiring = timezone.now() + timezone.timedelta(seconds=300)
+        return ExpiringLink.objects.create(image=image, expiring=expiring)
+
+    def test_cached_link_queries(self):
+        """
+        Link used before is served without database queries
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link()
+            client.get(link.get_absolute_url())
+            with self.assertNumQueries(0):
+                response = client.get(link.get_absolute_url())
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pil_image = PIL_Image.open(io.BytesIO(next(response.streaming_content)))
+            self.assertEqual(pil_image.size, (200, 200))
+
+    def test_deleted_link(self):
+        """
+        Try to use cached link after it was deleted
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link()
+            client.get(link.get_absolute_url())
+            with self.captureOnCommitCallbacks(execute=True):
+                link.delete()
+            response = client.get(link.get_absolute_url())
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleted_image(self):
+        """
+        Try to use cached link after its image was deleted
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link()
+            client.get(link.get_absolute_url())
+            with mock.patch.object(delete_files, 'delay'), self.captureOnCommitCallbacks(execute=True):
+                link.image.delete()
+            response = client.get(link.get_absolute_url())
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    def test_deleted_link_read_before_commit(self):
+        """
+        Link cached again by a request that read it before the delete committed is invalidated on commit
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            link = self._create_link()
+            cached = get_link(link.name)
+            with self.captureOnCommitCallbacks(execute=True):
+                link.delete()
+                # request of another process still sees the link until commit
+                cache.set(f'images:link:{link.name}', cached, 300)
+            self.assertIsNone(cache.get(f'images:link:{link.name}'))
+            response = client.get(link.get_absolute_url())
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class ExpiringLinkBucketsTest(APITestCaseWithMedia):
+    """
+    Test deleting expired links by hourly buckets
+    """
+    fixtures = ['accounts.json']
+
+    def _create_links(self, now, *offsets):
+        image = self._create_image(('chessGM', 'YUsPygfgf8rLaU7'))
+        return [ExpiringLink.objects.create(image=image, expiring=now + timezone.timedelta(minutes=offset))
+                for offset in offsets]
+
+    def test_delete_expired_buckets(self):
+        """
+        Only links of completely expired hours are deleted
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            now = timezone.now().replace(minute=30)
+            old, current, valid = self._create_links(now, -31, -20, 15)
+            delete_expired_buckets(now)
+            self.assertQuerysetEqual(ExpiringLink.objects.order_by('pk'), [current, valid])
+
+    def test_delete_expired_with_buckets(self):
+        """
+        Delete expired links with buckets enabled
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name, IMAGES={**settings.IMAGES, 'link_partitions': True}):
+            now = timezone.now()
+            links = self._create_links(now, -120, -1, 10)
+            call_command('delete_expired', stdout=io.StringIO())
+            self.assertQuerysetEqual(ExpiringLink.objects.all(), links[2:])
+
+    def test_create_partition_statements(self):
+        """
+        Rows of new partition range are moved out of the default partition before it is attached
+        """
+        start = datetime(2021, 12, 1, 10, tzinfo=dt_timezone.utc)
+        end = start + timezone.timedelta(hours=1)
+        lock, create, move, attach = create_partition_statements(start)
+        self.assertEqual(lock[0], 'LOCK TABLE "images_expiringlink_default" IN SHARE ROW EXCLUSIVE MODE')
+        self.assertEqual(create[0], 'CREATE TABLE "images_expiringlink_p2021120110" (LIKE "images_expiringlink" '
+                                    'INCLUDING ALL)')
+        self.assertEqual(move, ('WITH moved AS (DELETE FROM "images_expiringlink_default" '
+                                'WHERE expiring >= %s AND expiring < %s RETURNING *) '
+                                'INSERT INTO "images_expiringlink_p2021120110" SELECT * FROM moved', [start, end]))
+        self.assertEqual(attach, ('ALTER TABLE "images_expiringlink" '
+                                  'ATTACH PARTITION "images_expiringlink_p2021120110" '
+                                  'FOR VALUES FROM (%s) TO (%s)', [start, end]))
+
+
+    @skipUnless(connection.vendor == 'postgresql', "table partitioning needs postgres")
+    def test_partitions(self):
+        """
+        Partitioned table keeps valid links and constraints, links beyond created partitions move from
+        the default partition to a new one, partitions of expired hours are dropped
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            now = timezone.now()
+            expired, valid = self._create_links(now, -5, 90)
+            partition_table(now)
+            self.assertTrue(is_partitioned_table())
+            self.assertQuerysetEqual(ExpiringLink.objects.all(), [valid])
+
+            later = now + timezone.timedelta(hours=3)
+            far = ExpiringLink.objects.create(
+                image=valid.image, expiring=later + timezone.timedelta(seconds=settings.IMAGES['max_seconds']))
+            delete_expired_buckets(later)
+            self.assertQuerysetEqual(ExpiringLink.objects.all(), [far])
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT tableoid::regclass::text FROM {ExpiringLink._meta.db_table}')
+                self.assertEqual(cursor.fetchone()[0], partition_name(bucket_start(far.expiring)))
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                ExpiringLink.objects.filter(pk=far.pk).update(hits=-1)
+
 class PostImageTest(APITestCaseWithMedia):
     """
     Test uploading image
@@ -217,6 +476,123 @@ class PostImageTest(APITestCaseWithMedia):
             self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
             self.assertEqual(Image.objects.all().count(), 0)
 
+    def test_upload_stores_metadata(self):
+        """
+        Test that format, dimensions and color mode are stored on upload
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            file = io.BytesIO()
+            pil_image = self._get_temporary_image((300, 200), 'png', file)
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': File(pil_image, 'name.png')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            image = Image.objects.get()
+            self.assertEqual((image.format, image.width, image.height, image.mode), ('PNG', 300, 200, 'RGB'))
+
+    def test_upload_content_type_mismatch(self):
+        """
+        Try uploading png image declared as jpeg
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            file = io.BytesIO()
+            pil_image = self._get_temporary_image((200, 200), 'png', file)
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': File(pil_image, 'name.jpg')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_upload_declared_content_type_mismatch(self):
+        """
+        Try uploading png image with png extension declared as jpeg
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            file = self._get_temporary_image((200, 200), 'png', io.BytesIO())
+            upload = SimpleUploadedFile('name.png', file.read(), content_type='image/jpeg')
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': upload})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('image/jpeg', response.json()['image'][0])
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_upload_too_many_pixels(self):
+        """
+        Try uploading image exceeding 'max_pixels' setting
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name, IMAGES={**settings.IMAGES, 'max_pixels': 10_000}):
+            file = io.BytesIO()
+            pil_image = self._get_temporary_image((200, 200), 'jpeg', file)
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': File(pil_image, 'name.jpg')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_upload_huge_dimensions(self):
+        """
+        Try uploading decompression bomb, it is rejected from the header without decoding
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            client.login(username='admin', password='admin')
+            with mock.patch.object(PIL_ImageFile.ImageFile, 'load', side_effect=AssertionError('decoded')):
+                response = client.post(reverse('images-list'),
+                                       {'image': File(self._get_png_header((9000, 9000)), 'name.png')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('9000x9000', response.json()['image'][0])
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_upload_too_many_decoded_bytes(self):
+        """
+        Try uploading image exceeding 'max_decoded_bytes' setting
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name,
+                           IMAGES={**settings.IMAGES, 'max_decoded_bytes': 100_000}):
+            file = io.BytesIO()
+            pil_image = self._get_temporary_image((200, 200), 'jpeg', file)
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': File(pil_image, 'name.jpg')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_upload_auto_orient(self):
+        """
+        Test that image with EXIF orientation is rotated and stored upright
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            exif = PIL_Image.Exif()
+            exif[ORIENTATION_TAG] = 6
+            file = io.BytesIO()
+            PIL_Image.new('RGB', (300, 200), (255, 0, 0)).save(file, 'jpeg', exif=exif.tobytes())
+            file.seek(0)
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': File(file, 'name.jpg')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            image = Image.objects.get()
+            self.assertEqual((image.width, image.height, image.orientation), (200, 300, 1))
+
+    def test_upload_strip_exif(self):
+        """
+        Test that EXIF is removed from stored file when 'strip_exif' is enabled
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name, IMAGES={**settings.IMAGES, 'strip_exif': True}):
+            exif = PIL_Image.Exif()
+            exif[0x010F] = 'camera maker'
+            file = io.BytesIO()
+            PIL_Image.new('RGB', (300, 200), (255, 0, 0)).save(file, 'jpeg', exif=exif.tobytes())
+            file.seek(0)
+            client.login(username='admin', password='admin')
+            response = client.post(reverse('images-list'), {'image': File(file, 'name.jpg')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            with Image.objects.get().image.open() as stored, PIL_Image.open(stored) as pil_image:
+                self.assertNotIn('exif', pil_image.info)
+                self.assertEqual(pil_image.size, (300, 200))
+
 
 class GetImageTest(APITestCaseWithMedia):
     """
@@ -258,6 +634,25 @@ class GetImageTest(APITestCaseWithMedia):
             pil_image = PIL_Image.open(io.BytesIO(img_bytes))
             self.assertEqual(pil_image.size, (333, 443))
 
+    def test_image_name_matches_key(self):
+        """
+        Test that stored file name starts with image lookup key
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('sunshine', 'YUsPygfgf8rLaU7'))
+            self.assertTrue(image.image.name.startswith(image.key.hex))
+            self.assertEqual(reverse('media', args=[image.key]), reverse('media', args=[image.image.name]).split('.')[0])
+
+    def test_get_image_not_existing_key(self):
+        """
+        Try to get image with key that does not belong to any image
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            client.login(username='sunshine', password='YUsPygfgf8rLaU7')
+            response = client.get(reverse('media', args=[f'{uuid4().hex}.jpg']))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_another_user_image(self):
         """
         Try to get a picture of another user with the 'original image' perk
@@ -350,6 +745,73 @@ class GetThumbnailTest(APITestCaseWithMedia):
             client.logout()
             self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_get_thumbnail_after_tier_perks_change(self):
+        """
+        Test that cached perks follow perks added to and removed from account tier
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (500, 500))
+            tier = Tier.objects.get(account__user__username='seamel')
+            perk = Perk.objects.get(name='400px thumbnail')
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            response = client.get(reverse('thumbnail', args=[image.image.name, 400]))
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            with self.captureOnCommitCallbacks(execute=True):
+                tier.perks.add(perk)
+            response = client.get(reverse('thumbnail', args=[image.image.name, 400]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with self.captureOnCommitCallbacks(execute=True):
+                perk.tier_set.remove(tier)
+            response = client.get(reverse('thumbnail', args=[image.image.name, 400]))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_get_thumbnail_after_account_tier_change(self):
+        """
+        Test that cached perks follow account tier change
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (500, 500))
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            response = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            account = Account.objects.get(user__username='seamel')
+            account.tier = None
+            with self.captureOnCommitCallbacks(execute=True):
+                account.save()
+            response = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_get_thumbnail_cached_perks_queries(self):
+        """
+        Test that authorization with cached tier does not query account, tier or perks
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (300, 300))
+            user = User.objects.get(username='seamel')
+            get_tier(user.id)
+            with self.assertNumQueries(0):
+                self.assertTrue(can_access(user, image.owner_id, 200))
+                self.assertFalse(can_access(user, image.owner_id, 400))
+
+    def test_perks_invalidated_in_shared_cache(self):
+        """
+        Test that perks cached by other processes are invalidated once the change commits
+        """
+        with tempfile.TemporaryDirectory() as location, self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            # cache instance of another process
+            other_cache = FileBasedCache(location, {})
+            user = User.objects.get(username='seamel')
+            cached = get_tier(user.id)
+            self.assertEqual(other_cache.get(f'accounts:tier:{user.id}'), cached)
+            with self.captureOnCommitCallbacks(execute=True):
+                Tier.objects.get(account__user=user).perks.clear()
+                self.assertEqual(other_cache.get(f'accounts:tier:{user.id}'), cached)
+            self.assertIsNone(other_cache.get(f'accounts:tier:{user.id}'))
+            self.assertEqual(get_tier(user.id).perks, frozenset())
+
 
 class GetAllImagesTest(APITestCaseWithMedia):
     """
@@ -379,3 +841,389 @@ class GetAllImagesTest(APITestCaseWithMedia):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(len(response.data), 1)
             self.assertEqual(Image.objects.all().count(), 2)
+
+
+class DeleteImageTest(APITestCaseWithMedia):
+    """
+    Test deleting image files
+    """
+    fixtures = ['accounts.json']
+
+    def test_delete_image_files(self):
+        """
+        Delete image with thumbnail, files are deleted by task after commit
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (300, 300))
+            thumbnail_name = image.image.thumbnail['200x200'].name
+            storage = image.image.storage
+            self.assertTrue(storage.exists(thumbnail_name))
+
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            with mock.patch.object(delete_files, 'delay', side_effect=delete_files) as delay, \
+                    self.captureOnCommitCallbacks(execute=True):
+                response = client.delete(reverse('images-detail', args=[image.pk]))
+                self.assertTrue(storage.exists(image.image.name))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            delay.assert_called_once_with([image.image.name])
+            self.assertFalse(storage.exists(image.image.name))
+            self.assertFalse(storage.exists(thumbnail_name))
+
+    def test_delete_user_files(self):
+        """
+        Delete user with images, files of all images are sent to tasks after commit
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            images = [self._create_image(('seamel', 'ZwpDu9BGHRTTqKX')) for _ in range(3)]
+            with mock.patch.object(delete_files, 'delay') as delay, self.captureOnCommitCallbacks(execute=True):
+                User.objects.get(username='seamel').delete()
+                delay.assert_not_called()
+            self.assertCountEqual([name for call in delay.call_args_list for name in call.args[0]],
+                                  [image.image.name for image in images])
+
+    def test_delete_files_savepoint_rollback(self):
+        """
+        Image deleted in a rolled back savepoint is restored, its file is not sent to the task
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            deleted, restored = (self._create_image(('seamel', 'ZwpDu9BGHRTTqKX')) for _ in range(2))
+            storage = deleted.image.storage
+            with mock.patch.object(delete_files, 'delay', side_effect=delete_files) as delay, \
+                    self.captureOnCommitCallbacks(execute=True):
+                deleted.delete()
+                with self.assertRaises(DatabaseError), transaction.atomic():
+                    Image.objects.get(pk=restored.pk).delete()
+                    raise DatabaseError
+            delay.assert_called_once_with([deleted.image.name])
+            self.assertTrue(Image.objects.filter(pk=restored.pk).exists())
+            self.assertFalse(storage.exists(deleted.image.name))
+            self.assertTrue(storage.exists(restored.image.name))
+
+    def test_delete_orphaned_files(self):
+        """
+        Files without Image or Export are deleted by reconciler command, files of existing images and exports
+        are kept and so are files whose name is not exactly a key, e.g. with a suffix added by the storage
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (300, 300))
+            thumbnail_name = image.image.thumbnail['200x200'].name
+            storage = image.image.storage
+            export = Export.objects.create(owner=image.owner, expiring=timezone.now() + timezone.timedelta(hours=1),
+                                           archive=ContentFile(b'archive', name='export.zip'))
+            suffixed_name = storage.save(f'{uuid4().hex}_AbC1234.jpg', ContentFile(b'unknown'))
+            orphan_key = uuid4().hex
+            orphans = [
+                storage.save(f'{orphan_key}.jpg', ContentFile(b'orphan')),
+                storage.save(os.path.join('__sized__', f'{orphan_key}-thumbnail-200x200.jpg'), ContentFile(b'orphan')),
+                storage.save(os.path.join('exports', f'{orphan_key}.zip'), ContentFile(b'orphan')),
+            ]
+            call_command('delete_orphaned_files', min_age=0, stdout=io.StringIO())
+            for name in orphans:
+                self.assertFalse(storage.exists(name))
+            self.assertTrue(storage.exists(image.image.name))
+            self.assertTrue(storage.exists(thumbnail_name))
+            self.assertTrue(storage.exists(export.archive.name))
+            self.assertTrue(storage.exists(suffixed_name))
+
+
+class ExportTest(APITestCaseWithMedia):
+    """
+    Test exporting all images as ZIP archive
+    """
+    fixtures = ['accounts.json']
+
+    def test_export_unauthorized(self):
+        """
+        Try to export images without authorization
+        """
+        response = client.get(reverse('images-export'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_originals(self):
+        """
+        Export as staff user contains stored originals of your images only
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            images = [self._create_image(('admin', 'admin'), (300, 200)) for _ in range(2)]
+            self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'))
+            client.login(username='admin', password='admin')
+            response = client.get(reverse('images-export'))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+                self.assertCountEqual(archive.namelist(), [image.image.name for image in images])
+                for info in archive.infolist():
+                    self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+                with archive.open(images[0].image.name) as exported, images[0].image.open() as stored:
+                    self.assertEqual(exported.read(), stored.read())
+
+    def test_export_largest_allowed_thumbnail(self):
+        """
+        Export without 'original image' perk contains largest thumbnails allowed by your perks
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (500, 500))
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            response = client.get(reverse('images-export'))
+            client.logout()
+            with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+                self.assertEqual(archive.namelist(), [os.path.basename(image.get_thumbnail(200).name)])
+                pil_image = PIL_Image.open(archive.open(archive.namelist()[0]))
+                self.assertEqual(pil_image.size, (200, 200))
+
+    def test_export_async(self):
+        """
+        Create export built by celery task and download it from expiring link
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('admin', 'admin'))
+            client.login(username='admin', password='admin')
+            with mock.patch.object(build_export, 'delay') as delay, self.captureOnCommitCallbacks(execute=True):
+                response = client.post(reverse('exports-list'), {'seconds': 300})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertFalse(response.json()['ready'])
+            self.assertEqual(client.get(response.json()['url']).status_code, status.HTTP_202_ACCEPTED)
+
+            export = Export.objects.get()
+            delay.assert_called_once_with(export.pk)
+            build_export(export.pk)
+            response = client.get(response.json()['url'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+                self.assertEqual(archive.namelist(), [image.image.name])
+
+    def test_export_expired(self):
+        """
+        Try to download expired export
+        """
+        owner = User.objects.get(username='admin')
+        export = Export.objects.create(owner=owner, expiring=timezone.now() - timezone.timedelta(seconds=1))
+        response = client.get(export.get_absolute_url())
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+class ThrottleTest(APITestCaseWithMedia):
+    """
+    Test tier request rate and bandwidth limits
+    """
+    fixtures = ['accounts.json']
+
+    def setUp(self):
+        super().setUp()
+        self.tier = Tier.objects.get(account__user__username='seamel')
+
+    def test_request_rate_limit(self):
+        """
+        Requests over tier 'requests_per_second' are rejected
+        """
+        self.tier.requests_per_second = 2
+        self.tier.save()
+        client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+        responses = [client.get(reverse('images-list')) for _ in range(3)]
+        client.logout()
+        self.assertEqual([response.status_code for response in responses],
+                         [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_request_rate_staff_unlimited(self):
+        """
+        Staff users are not limited
+        """
+        self.tier.requests_per_second = 1
+        self.tier.save()
+        client.login(username='admin', password='admin')
+        responses = [client.get(reverse('images-list')) for _ in range(3)]
+        client.logout()
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_200_OK] * 3)
+
+    def test_download_quota(self):
+        """
+        Downloads are rejected after tier 'download_bytes_per_day' is used
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (300, 300))
+            self.tier.download_bytes_per_day = 1
+            self.tier.save()
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            first = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            second = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            client.logout()
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_upload_quota(self):
+        """
+        Uploads larger than remaining tier 'upload_bytes_per_day' are rejected
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            self.tier.upload_bytes_per_day = 100
+            self.tier.save()
+            file = io.BytesIO()
+            pil_image = self._get_temporary_image((200, 200), 'jpeg', file)
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            response = client.post(reverse('images-list'), {'image': File(pil_image, 'name.jpg')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_tier_read_once_per_request(self):
+        """
+        Throttles and access check of a media request share one tier lookup
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (300, 300))
+            local_tiers.clear()
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            with mock.patch('accounts.tiers.get_tier', wraps=get_tier) as lookup:
+                response = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            lookup.assert_called_once_with(image.owner_id)
+
+    def test_limits_invalidated_in_shared_cache(self):
+        """
+        Limits cached by other processes are invalidated once the tier change commits
+        """
+        with tempfile.TemporaryDirectory() as location, self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            # cache instance of another process
+            other_cache = FileBasedCache(location, {})
+            user_id = User.objects.get(username='seamel').id
+            cached = get_tier(user_id)
+            self.assertEqual(other_cache.get(f'accounts:tier:{user_id}'), cached)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tier.requests_per_second = 1
+                self.tier.save()
+                self.assertEqual(other_cache.get(f'accounts:tier:{user_id}'), cached)
+            self.assertIsNone(other_cache.get(f'accounts:tier:{user_id}'))
+            self.assertEqual(get_tier(user_id).limits.requests_per_second, 1)
+
+
+class HealthTest(APITestCase):
+    """
+    Test liveness and readiness probes
+    """
+
+    def setUp(self):
+        patcher = mock.patch('Images_DRF.views._migrated', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_health(self):
+        """
+        Liveness probe does not need the database
+        """
+        with self.assertNumQueries(0):
+            response = client.get(reverse('health'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ready(self):
+        """
+        Ready with reachable database and applied migrations, migrations are checked only once
+        """
+        response = client.get(reverse('ready'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            response = client.get(reverse('ready'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_not_ready_migrations_pending(self):
+        """
+        Not ready while migrations are not applied
+        """
+        with mock.patch('Images_DRF.views.MigrationExecutor.migration_plan', return_value=[('images', '0006')]):
+            response = client.get(reverse('ready'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class StartupImportsTest(SimpleTestCase):
+    """
+    Test that web process does not import task queue packages at start
+    """
+
+    def test_web_imports(self):
+        """
+        Fresh process importing wsgi application and urls has no celery, kombu or redis in sys.modules
+        """
+        code = (f"{TARGETS['web']}; import sys; "
+                f"print(' '.join(package for package in {LAZY_PACKAGES!r} if package in sys.modules))")
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'Images_DRF.settings'}
+        result = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(), [])
+
+
+class ImageBudgetTest(APITestCaseWithMedia):
+    """
+    Test tier image limits and memory bounded thumbnails
+    """
+    fixtures = ['accounts.json']
+
+    def setUp(self):
+        super().setUp()
+        self.tier = Tier.objects.get(account__user__username='seamel')
+
+    def test_tier_max_megapixels(self):
+        """
+        Uploads over tier 'max_megapixels' are rejected from the header
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            self.tier.max_megapixels = 1
+            self.tier.save()
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            response = client.post(reverse('images-list'),
+                                   {'image': File(self._get_png_header((2000, 1000)), 'name.png')})
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(Image.objects.all().count(), 0)
+
+    def test_tier_max_decoded_bytes(self):
+        """
+        Uploads over tier 'max_decoded_bytes' are rejected, smaller ones are accepted
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            self.tier.max_decoded_bytes = 100_000
+            self.tier.save()
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            large = self._get_temporary_image((200, 200), 'jpeg', io.BytesIO())
+            small = self._get_temporary_image((100, 100), 'jpeg', io.BytesIO())
+            rejected = client.post(reverse('images-list'), {'image': File(large, 'large.jpg')})
+            accepted = client.post(reverse('images-list'), {'image': File(small, 'small.jpg')})
+            client.logout()
+            self.assertEqual(rejected.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(accepted.status_code, status.HTTP_201_CREATED)
+
+    def test_thumbnail_reduced_decoding(self):
+        """
+        Large JPEG is decoded at reduced scale for thumbnail
+        """
+        sizes = []
+        process_image = BoundedThumbnailImage.process_image
+
+        def record_size(sizer, image, **kwargs):
+            sizes.append(image.size)
+            return process_image(sizer, image=image, **kwargs)
+
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (1600, 1600))
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            with mock.patch.object(BoundedThumbnailImage, 'process_image', record_size):
+                response = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(sizes, [(400, 400)])
+            pil_image = PIL_Image.open(io.BytesIO(next(response.streaming_content)))
+            self.assertEqual(pil_image.size, (200, 200))
+
+    def test_thumbnail_over_budget(self):
+        """
+        Thumbnail is not made of image that does not fit into the budget once decoded
+        """
+        with self.settings(MEDIA_ROOT=self.temporary_dir.name):
+            image = self._create_image(('seamel', 'ZwpDu9BGHRTTqKX'), (300, 300))
+            client.login(username='seamel', password='ZwpDu9BGHRTTqKX')
+            with self.settings(IMAGES={**settings.IMAGES, 'max_decoded_bytes': 100_000}):
+                response = client.get(reverse('thumbnail', args=[image.image.name, 200]))
+            client.logout()
+            self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
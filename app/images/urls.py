@@ -1,14 +1,19 @@
-from django.urls import path
+from django.urls import path, register_converter
 from rest_framework import routers
 
+from .converters import ImageKeyConverter
 from .views import ImageViewSet, media_access, get_thumbnail, \
-    access_expiring, ExpiringLinkViewSet
+    access_expiring, ExpiringLinkViewSet, access_export, ExportViewSet
+
+register_converter(ImageKeyConverter, 'image_key')
 
 router = routers.DefaultRouter()
 router.register(r'images', ImageViewSet, basename='images')
 router.register(r'expiring', ExpiringLinkViewSet, basename='expiring')
+router.register(r'exports', ExportViewSet, basename='exports')
 urlpatterns = router.urls + [
-    path('media/<str:path>', media_access, name='media'),
-    path('media/<str:path>/<int:height>', get_thumbnail, name='thumbnail'),
+    path('media/<image_key:key>', media_access, name='media'),
+    path('media/<image_key:key>/<int:height>', get_thumbnail, name='thumbnail'),
     path('link/<str:name>', access_expiring, name='get-expiring'),
+    path('export/<str:name>', access_export, name='get-export'),
 ]
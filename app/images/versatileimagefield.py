@@ -0,0 +1,31 @@
+from versatileimagefield.registry import versatileimagefield_registry
+from versatileimagefield.versatileimagefield import ThumbnailImage
+
+from .processing import check_budget, get_budget
+
+# JPEGs are decoded at the smallest DCT scale that keeps this multiple of the thumbnail size
+REDUCING_GAP = 2
+
+
+class BoundedThumbnailImage(ThumbnailImage):
+    """
+    Thumbnail sizer with bounded decoding memory.
+    JPEGs are decoded at reduced scale close to the thumbnail size, other images are decoded
+    only if they fit into the global image budget.
+    """
+
+    def create_resized_image(self, path_to_image, save_path_on_storage, width, height):
+        image, file_ext, image_format, mime_type = self.retrieve_image(path_to_image)
+        # image may be rotated by its EXIF orientation after decoding, reduced size fits both orientations
+        side = max(width, height) * REDUCING_GAP
+        image.draft(None, (side, side))
+        check_budget(*image.size, image.mode, get_budget())
+
+        image, save_kwargs = self.preprocess(image, image_format)
+        imagefile = self.process_image(image=image, image_format=image_format, save_kwargs=save_kwargs,
+                                       width=width, height=height)
+        self.save_image(imagefile, save_path_on_storage, file_ext, mime_type)
+
+
+versatileimagefield_registry.unregister_sizer('thumbnail')
+versatileimagefield_registry.register_sizer('thumbnail', BoundedThumbnailImage)
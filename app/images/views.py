@@ -1,15 +1,20 @@
-from accounts.models import Account
-from django.conf import settings
+from accounts.throttling import TierRequestRateThrottle, DownloadThrottle, UploadThrottle, record_transfer
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.http import \
-    HttpResponseForbidden, HttpResponseGone, FileResponse
+    HttpResponse, HttpResponseForbidden, HttpResponseGone, FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.mixins import DestroyModelMixin, CreateModelMixin, ListModelMixin, RetrieveModelMixin
 
-from .models import Image, ExpiringLink
-from .serializers import ImageSerializer, ExpiringLinkSerializer
+from .access import can_access
+from .export import iter_zip, export_entries
+from .hits import record_hit
+from .links import get_link
+from .models import Image, ExpiringLink, Export
+from .serializers import ImageSerializer, ExpiringLinkSerializer, ExportSerializer
 
 
 @api_view(['GET'])
@@ -18,57 +23,60 @@ def access_expiring(request, name):
     """
     view to access image under expiring link
     """
-    link = get_object_or_404(ExpiringLink, name=name)
+    link = get_link(name)
     if link.expiring < timezone.now():
         return HttpResponseGone("Link expired")
-    return FileResponse(link.image.image)
+    if not record_hit(link):
+        return HttpResponseGone("Link reached maximum number of uses")
+    return FileResponse(Image._meta.get_field('image').storage.open(link.storage_name))
 
 
 @api_view(['GET'])
-def media_access(request, path):
+@permission_classes([])
+def access_export(request, name):
+    """
+    view to download export archive under expiring link
+    """
+    export = get_object_or_404(Export, name=name)
+    if export.expiring < timezone.now():
+        return HttpResponseGone("Link expired")
+    if not export.archive:
+        return HttpResponse("Export in progress", status=202)
+    return FileResponse(export.archive, as_attachment=True)
+
+
+@api_view(['GET'])
+@throttle_classes([TierRequestRateThrottle, DownloadThrottle])
+def media_access(request, key):
     """
     View to access original image
     """
-    access = False
     user = request.user
-    image = get_object_or_404(Image, image=path)
-    if user.is_staff:
-        access = True
-    elif image.owner == user:
-        account = Account.objects.filter(user=user).first()
-        perks = account.tier.perks.filter(name__exact=settings.IMAGES.get('original_image_perk', ''))
-        if perks:
-            access = True
-
-    if access:
+    image = get_object_or_404(Image, key=key)
+    if can_access(user, image.owner_id, request=request):
         response = FileResponse(image.image)
+        record_transfer(user, 'download', image.image.size)
         return response
 
     return HttpResponseForbidden(f'Not authorized to access this file {user}')
 
 
 @api_view(['GET'])
-def get_thumbnail(request, path, height):
+@throttle_classes([TierRequestRateThrottle, DownloadThrottle])
+def get_thumbnail(request, key, height):
     """
     View to access thumbnail
     """
-    access = False
-    user = request.user
-    image = get_object_or_404(Image, image=path)
-    if user.is_staff:
-        access = True
-    elif image.owner == user:
-        account = Account.objects.filter(user=user).first()
-        perk_name = settings.IMAGES.get('height_perk_name').get(height, None)
-        if perk_name:
-            perk = account.tier.perks.filter(name__exact=perk_name)
-            if perk:
-                access = True
-
-    if access:
-        new_width = height * image.width // image.height
-        thumbnail_image = image.image.field.storage.open(image.image.thumbnail[f'{height}x{new_width}'].name)
+    image = get_object_or_404(Image, key=key)
+    if can_access(request.user, image.owner_id, height, request):
+        try:
+            thumbnail = image.get_thumbnail(height)
+        except ValidationError as error:
+            # image exceeds memory budget of rendition workers
+            return HttpResponse(' '.join(error.messages), status=422)
+        thumbnail_image = image.image.field.storage.open(thumbnail.name)
         response = FileResponse(thumbnail_image)
+        record_transfer(request.user, 'download', thumbnail_image.size)
         return response
 
     return HttpResponseForbidden('Not authorized to access this file')
@@ -86,15 +94,60 @@ class CreateListDeleteRetrieveViewSet(DestroyModelMixin, CreateModelMixin,
     pass
 
 
+def record_streamed_download(chunks, user):
+    """
+    Counts bytes of streamed response and adds them to user's daily usage once streaming ends
+    """
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        record_transfer(user, 'download', size)
+
+
 class ImageViewSet(CreateListDeleteRetrieveViewSet):
     serializer_class = ImageSerializer
+    throttle_classes = [TierRequestRateThrottle, UploadThrottle]
 
     def get_queryset(self):
         return self.request.user.image_set.all()
 
+    def perform_create(self, serializer):
+        image = serializer.save()
+        record_transfer(self.request.user, 'upload', image.image.size)
+
+    @action(detail=False, throttle_classes=[TierRequestRateThrottle, DownloadThrottle])
+    def export(self, request):
+        """
+        Streams ZIP archive of all your images, originals or largest thumbnails your perks allow
+        """
+        chunks = iter_zip(export_entries(request.user, self.get_queryset()))
+        response = StreamingHttpResponse(record_streamed_download(chunks, request.user),
+                                         content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="images.zip"'
+        return response
+
 
 class ExpiringLinkViewSet(CreateListDeleteRetrieveViewSet):
     serializer_class = ExpiringLinkSerializer
 
     def get_queryset(self):
         return ExpiringLink.objects.filter(image__owner=self.request.user)
+
+
+class ExportViewSet(CreateListDeleteRetrieveViewSet):
+    """
+    Archives of all your images built by celery worker, downloadable under expiring link
+    """
+    serializer_class = ExportSerializer
+
+    def get_queryset(self):
+        return Export.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        # celery is imported only by processes that send tasks
+        from Images_DRF.tasks import build_export
+        export = serializer.save()
+        transaction.on_commit(lambda: build_export.delay(export.pk))